@@ -0,0 +1,207 @@
+# Admission control for /graphql: per-client rate limits and load shedding
+# File: /api/admission.py
+
+import time
+import ipaddress
+import threading
+from functools import wraps
+from collections import OrderedDict
+from flask import request
+from api.encoding import json_response
+from comm.config import env_setting
+from comm.server import stream_slots, worker_slots
+import comm.app_logging as logging
+
+logger = logging.getLogger(__name__)
+
+
+# What is left of the worker's slots after the subscription streams, less one
+# kept free for /health; 8 when the worker's concurrency is unknown
+def default_concurrency(slots):
+    if slots is None:
+        return 8
+    return max(1, slots - stream_slots(slots) - 1)
+
+
+# Tuning knobs (environment only, read once at import)
+RATE_LIMIT = env_setting("IPMAN_RATE_LIMIT", 50.0, float)  # Operations per second per client, 0 disables
+RATE_BURST = env_setting("IPMAN_RATE_BURST", 100.0, float)
+MAX_CLIENTS = env_setting("IPMAN_RATE_MAX_CLIENTS", 10000, int)
+MAX_CONCURRENT = env_setting("IPMAN_MAX_CONCURRENT", default_concurrency(worker_slots()), int)  # Per worker process
+MAX_WAITING = env_setting("IPMAN_MAX_WAITING", 32, int)
+TARGET_QUEUE_DELAY = env_setting("IPMAN_TARGET_QUEUE_DELAY", 0.1, float)  # Seconds
+CLIENT_HEADER = env_setting("IPMAN_CLIENT_ID_HEADER", "X-Client-Id")
+# Proxies (addresses or CIDRs, comma separated) whose client headers are believed
+TRUSTED_PROXIES = env_setting("IPMAN_TRUSTED_PROXIES", "")
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    # A cost above the burst could never be paid, so it is capped at the burst
+    def take(self, cost=1):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= min(cost, self.burst):
+            self.tokens -= min(cost, self.burst)
+            return True
+        return False
+
+    # Seconds until enough tokens for cost are available
+    def retry_after(self, cost=1):
+        return max(0.0, (min(cost, self.burst) - self.tokens) / self.rate) if self.rate else 1.0
+
+
+class RateLimiter:
+    """Token bucket per client, with the least recently seen clients evicted."""
+
+    def __init__(self, rate, burst, max_clients):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, client, cost=1):
+        """Return (allowed, retry_after_seconds) for a request worth cost tokens."""
+        if self.rate <= 0:
+            return True, 0.0
+        with self._lock:
+            bucket = self._buckets.pop(client, None) or TokenBucket(self.rate, self.burst)
+            self._buckets[client] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            if bucket.take(cost):
+                return True, 0.0
+            return False, bucket.retry_after(cost)
+
+
+class ConcurrencyLimiter:
+    """Bounded number of in-flight requests with a bounded, time-limited queue.
+
+    Requests wait at most target_delay for a slot; beyond that (or when too
+    many are already waiting) they are shed so the worker stays responsive.
+    """
+
+    def __init__(self, max_concurrent, max_waiting, target_delay):
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self.max_waiting = max_waiting
+        self.target_delay = target_delay
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self._slots.acquire(blocking=False):
+            return True
+        with self._lock:
+            if self._waiting >= self.max_waiting:
+                return False
+            self._waiting += 1
+        try:
+            return self._slots.acquire(timeout=self.target_delay)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def release(self):
+        self._slots.release()
+
+
+rate_limiter = RateLimiter(RATE_LIMIT, RATE_BURST, MAX_CLIENTS)
+concurrency_limiter = ConcurrencyLimiter(MAX_CONCURRENT, MAX_WAITING, TARGET_QUEUE_DELAY)
+
+
+def parse_networks(value):
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in value.split(",") if item.strip()]
+
+
+trusted_proxies = parse_networks(TRUSTED_PROXIES)
+
+
+def _is_trusted(address, proxies):
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in proxies)
+
+
+def client_key(proxies=None):
+    """The rate limiting key of the current request.
+
+    Client headers can be forged by anyone, so they are only used when the
+    peer is a trusted proxy. The client is then the nearest X-Forwarded-For
+    hop that is not a trusted proxy itself.
+    """
+    proxies = trusted_proxies if proxies is None else proxies
+    peer = request.remote_addr or "unknown"
+    if not _is_trusted(peer, proxies):
+        return peer
+    client_id = request.headers.get(CLIENT_HEADER)
+    if client_id:
+        return client_id
+    hops = [hop.strip() for hop in request.headers.get("X-Forwarded-For", "").split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted(hop, proxies):
+            return hop
+    return hops[0] if hops else peer
+
+
+# Time spent queued before reaching this worker, from the proxy's X-Request-Start
+# header ("t=<seconds|milliseconds|microseconds since epoch>"), if present
+def upstream_queue_delay():
+    header = request.headers.get("X-Request-Start")
+    if not header:
+        return None
+    try:
+        started = float(header.split("=")[-1])
+    except ValueError:
+        return None
+    # Normalise to seconds
+    while started > 1e11:
+        started /= 1000.0
+    return max(0.0, time.time() - started)
+
+
+# A batched POST costs one token per operation
+def request_cost():
+    body = request.get_json(silent=True) if request.method == "POST" else None
+    return max(1, len(body)) if isinstance(body, list) else 1
+
+
+def _reject(status, message, retry_after):
+    response = json_response({"errors": [{"message": message}]}, status)
+    response.headers["Retry-After"] = str(max(1, int(retry_after + 0.999)))
+    return response
+
+
+def admission_control(view):
+    """Shed load before the request reaches the database."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        client = client_key()
+        allowed, retry_after = rate_limiter.allow(client, request_cost())
+        if not allowed:
+            logger.warning(f"Rate limit exceeded for client {client}.")
+            return _reject(429, "Too many requests.", retry_after)
+
+        delay = upstream_queue_delay()
+        if delay is not None and delay > TARGET_QUEUE_DELAY:
+            logger.warning(f"Shedding request queued upstream for {delay:.3f}s.")
+            return _reject(503, "Server overloaded, please retry.", 1)
+
+        if not concurrency_limiter.acquire():
+            logger.warning("Shedding request: concurrency limit reached.")
+            return _reject(503, "Server overloaded, please retry.", 1)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            concurrency_limiter.release()
+
+    return wrapper
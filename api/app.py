@@ -1,29 +1,96 @@
 # File: app.py
 
+import hmac
 import threading
 import os
+import json
+import queue
+from contextlib import contextmanager
 import comm.app_logging as logging
 from logging.config import dictConfig
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from ariadne import graphql_sync
 from ariadne.constants import PLAYGROUND_HTML
-from sqlalchemy.exc import OperationalError
-from sqlalchemy.sql import text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import joinedload
 from sqlalchemy.dialects.postgresql import CIDR
-from database.db import get_db_session
+from database.db import read_session_scope
+from api.shared_cache import SharedLookupCache
 from database.models import (
     IPAddress,
     Service,
 )  # Import the IPAddress model and  the Service model here
-from api.schema import schema
+from api.schema import schema, snapshot_schema
+from database.snapshot import SnapshotStore
+from database import profiler
+from api.encoding import json_response, encode_json
+from api.subscriptions import ChangeListener, PreparedSubscription
+from api.admission import admission_control
+from api.health import HealthMonitor, probe_database, probe_consul
+from comm.config import env_setting
+from comm.server import stream_slots, worker_slots
 from graphql import GraphQLError
 
 
 # Initialize the Flask app for the API
 api_app = Flask(__name__)
 
+# Maximum number of operations accepted in one batched POST
+MAX_BATCH_SIZE = env_setting("IPMAN_GRAPHQL_MAX_BATCH", 50, int)
+
+# Requests carrying this header with the profiler token get their SQL profile
+# (statements and plans) in the response extensions; off unless a token is set
+PROFILE_HEADER = env_setting("IPMAN_PROFILER_HEADER", "X-IPMan-Debug-Queries")
+PROFILE_TOKEN = env_setting("IPMAN_PROFILER_TOKEN")
+
+# Subscriptions: one LISTEN connection per worker process fans out to its streams.
+# Each stream holds a thread (or greenlet) while open, so a worker never gives
+# more than half of them to streams; a sync worker has none to spare.
+STREAM_SLOTS = stream_slots(worker_slots())
+MAX_SUBSCRIBERS = env_setting("IPMAN_SSE_MAX_SUBSCRIBERS", 100, int)
+if STREAM_SLOTS is not None:
+    MAX_SUBSCRIBERS = min(MAX_SUBSCRIBERS, STREAM_SLOTS)
+change_listener = ChangeListener(
+    max_subscribers=MAX_SUBSCRIBERS,
+    max_queue=env_setting("IPMAN_SSE_QUEUE_SIZE", 1000, int),
+)
+SSE_HEARTBEAT = env_setting("IPMAN_SSE_HEARTBEAT", 15.0, float)
+STREAMING_SUPPORTED = MAX_SUBSCRIBERS > 0
+
+# Snapshot serving mode: answer queries from a snapshot file, without a database
+SNAPSHOT_PATH = env_setting("IPMAN_SNAPSHOT_PATH")
+snapshot_store = (
+    SnapshotStore(SNAPSHOT_PATH, env_setting("IPMAN_SNAPSHOT_RELOAD_INTERVAL", 1.0, float))
+    if SNAPSHOT_PATH
+    else None
+)
+
+# Lookup cache shared by all workers of the node (ipByAddress / ipByCIDR)
+shared_cache = (
+    SharedLookupCache(
+        env_setting("IPMAN_SHARED_CACHE_PATH", "/dev/shm/ipman-lookup.snap"),
+        read_session_scope,
+        refresh_interval=env_setting("IPMAN_SHARED_CACHE_REFRESH_INTERVAL", 5.0, float),
+        max_age=env_setting("IPMAN_SHARED_CACHE_MAX_AGE", 30.0, float),
+        rebuild_interval=env_setting("IPMAN_SHARED_CACHE_REBUILD_INTERVAL", 300.0, float),
+    )
+    if env_setting("IPMAN_SHARED_CACHE", False, bool) and snapshot_store is None
+    else None
+)
+
+
+# Database and Consul are probed in the background; health endpoints read the last result
+health_monitor = (
+    HealthMonitor(
+        {"database": probe_database, "consul": probe_consul},
+        required=("database",),
+        interval=env_setting("IPMAN_HEALTH_INTERVAL", 2.0, float),
+        max_age=env_setting("IPMAN_HEALTH_MAX_AGE", 10.0, float),
+    )
+    if snapshot_store is None
+    else None
+)
+
 
 # Custom error formatter to simplify the error output
 def custom_format_error(error, debug):
@@ -60,22 +127,48 @@ dictConfig(
 logger = logging.getLogger(__name__)
 
 
-# Health check for the API
+# Health check for the API (answered from the background probe results)
 @api_app.route("/health", methods=["GET"])
 def health_check():
-    try:
-        # Test database connectivity
-        db_session = next(get_db_session())
-        result = db_session.execute(text("SELECT 1")).fetchone()  # Basic DB query
-        if result:
-            logger.info("API Health check passed, database connected.")
-            return jsonify({"status": "healthy", "database": "connected"}), 200
-    except OperationalError:
-        logger.error("Database connection failed during API health check.")
-        return jsonify({"status": "unhealthy", "database": "connection failed"}), 500
-    except Exception as e:
-        logger.error(f"API Health check error: {e}")
-        return jsonify({"status": "unhealthy", "error": str(e)}), 500
+    if snapshot_store is not None:
+        snapshot = snapshot_store.get()
+        if snapshot is None:
+            return jsonify({"status": "unhealthy", "snapshot": "not loaded"}), 500
+        return (
+            jsonify(
+                {
+                    "status": "healthy",
+                    "snapshot": {"generatedAt": snapshot.generated_at, "records": snapshot.n_records},
+                }
+            ),
+            200,
+        )
+    if health_monitor.healthy("database"):
+        return jsonify({"status": "healthy", "database": "connected"}), 200
+    if health_monitor.stale():
+        return jsonify({"status": "unhealthy", "database": "health checks are stale"}), 500
+    return jsonify({"status": "unhealthy", "database": "connection failed"}), 500
+
+
+# Liveness probe: the worker is up and serving requests
+@api_app.route("/health/live", methods=["GET"])
+def liveness_check():
+    if snapshot_store is not None:
+        return jsonify({"status": "alive", "pid": os.getpid()}), 200
+    body, status = health_monitor.liveness()
+    return jsonify(body), status
+
+
+# Readiness probe: the worker's dependencies were reachable at the last check
+@api_app.route("/health/ready", methods=["GET"])
+def readiness_check():
+    if snapshot_store is not None:
+        snapshot = snapshot_store.get()
+        if snapshot is None:
+            return jsonify({"status": "unready", "snapshot": "not loaded"}), 503
+        return jsonify({"status": "ready", "snapshot": {"generatedAt": snapshot.generated_at}}), 200
+    body, status = health_monitor.readiness()
+    return jsonify(body), status
 
 
 # GraphQL Playground at /graphql
@@ -84,28 +177,146 @@ def graphql_playground():
     return PLAYGROUND_HTML  # Use the constant for the GraphQL Playground
 
 
-# GraphQL execution endpoint
+# Per-request execution context: a read session, or the current snapshot
+@contextmanager
+def operation_context():
+    if snapshot_store is not None:
+        yield {"request": request, "snapshot": snapshot_store.get()}
+        return
+    lookup_cache = shared_cache.reader() if shared_cache is not None else None
+    with read_session_scope() as session:
+        yield {"request": request, "session": session, "lookup_cache": lookup_cache}
+
+
+# The SQL profile is only returned to callers presenting the configured token
+def profile_requested():
+    if not PROFILE_HEADER or not PROFILE_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get(PROFILE_HEADER, "").encode(), PROFILE_TOKEN.encode())
+
+
+# Run a single GraphQL operation within the request context
+def execute_operation(data, context):
+    if not isinstance(data, dict):
+        return False, {"errors": [{"message": "Each operation must be a JSON object."}]}
+    with profiler.profile(data.get("operationName") or "anonymous operation") as query_profile:
+        try:
+            success, result = graphql_sync(
+                snapshot_schema if snapshot_store is not None else schema,
+                data,
+                context_value=context,
+                debug=True,
+                error_formatter=custom_format_error,
+            )
+        except Exception as e:
+            logger.error(f"GraphQL operation raised an unexpected error: {e}")
+            success, result = False, {"errors": [{"message": str(e)}]}
+    if profile_requested():
+        result.setdefault("extensions", {})["queries"] = query_profile.summary()
+    if "session" in context and (not success or result.get("errors")):
+        # Isolate failures: a broken transaction must not leak into the next operation
+        context["session"].rollback()
+    return success, result
+
+
+# GraphQL execution endpoint (single operation or a batch as a JSON array)
 @api_app.route("/graphql", methods=["POST"])
+@admission_control
 def graphql_server():
     data = request.get_json()
     logger.info(f"GraphQL request received: {data}")
-    success, result = graphql_sync(
-        schema,
-        data,
-        context_value=request,
-        debug=True,
-        error_formatter=custom_format_error,
-    )
+
+    if isinstance(data, list):
+        if not data:
+            return json_response({"errors": [{"message": "Empty batch."}]}, 400)
+        if not all(isinstance(operation, dict) for operation in data):
+            return json_response({"errors": [{"message": "Each operation must be a JSON object."}]}, 400)
+        if len(data) > MAX_BATCH_SIZE:
+            logger.warning(f"Rejected GraphQL batch of {len(data)} operations.")
+            return json_response(
+                {"errors": [{"message": f"Batch size exceeds limit of {MAX_BATCH_SIZE}."}]},
+                400,
+            )
+        with operation_context() as context:
+            results = [execute_operation(operation, context)[1] for operation in data]
+        logger.info(f"GraphQL batch of {len(data)} operations executed.")
+        return json_response(results, request=request)
+
+    with operation_context() as context:
+        success, result = execute_operation(data, context)
     if success:
         logger.info("GraphQL query executed successfully.")
     else:
         logger.error("GraphQL query execution failed.")
-    return jsonify(result)
+    return json_response(result, request=request)
+
+
+# Server-Sent Events stream of one GraphQL subscription (GET for EventSource, or POST)
+@api_app.route("/graphql/stream", methods=["GET", "POST"])
+@admission_control
+def graphql_stream():
+    if snapshot_store is not None:
+        return json_response(
+            {"errors": [{"message": "Subscriptions are not available when serving from a snapshot."}]}, 400
+        )
+    if not STREAMING_SUPPORTED:
+        logger.warning("Rejected subscription: workers have no slots to spare for streams.")
+        return json_response(
+            {"errors": [{"message": "Subscriptions need gthread or gevent workers on this server."}]}, 503
+        )
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+    else:
+        try:
+            variables = json.loads(request.args.get("variables") or "{}")
+        except ValueError:
+            return json_response({"errors": [{"message": "variables must be a JSON object."}]}, 400)
+        data = {
+            "query": request.args.get("query"),
+            "variables": variables,
+            "operationName": request.args.get("operationName"),
+        }
+    try:
+        prepared = PreparedSubscription(
+            schema, data.get("query"), data.get("variables"), data.get("operationName")
+        )
+    except GraphQLError as e:
+        return json_response({"errors": [{"message": e.message}]}, 400)
+
+    subscriber = change_listener.subscribe()
+    if subscriber is None:
+        logger.warning("Rejected subscription: subscriber limit reached.")
+        return json_response({"errors": [{"message": "Too many subscribers, please retry."}]}, 503)
+    logger.info("GraphQL subscription started.")
+
+    def events():
+        try:
+            yield ": subscribed\n\n"
+            while not subscriber.overflowed:
+                try:
+                    changes = subscriber.events.get(timeout=SSE_HEARTBEAT)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                for change in changes:
+                    if prepared.matches(change):
+                        yield f"event: next\ndata: {encode_json(prepared.execute(change)).decode()}\n\n"
+            yield 'event: error\ndata: {"errors": [{"message": "Subscriber too slow, events were dropped."}]}\n\n'
+        finally:
+            change_listener.unsubscribe(subscriber)
+            logger.info("GraphQL subscription ended.")
+
+    return Response(
+        events(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
-# Function to run API (on all IPs)
+# Function to run API (on all IPs); development server only, production runs
+# under Gunicorn (python -m comm.server api)
 def run_api():
-    api_app.run(debug=True, host="0.0.0.0", port=5000)
+    api_app.run(debug=env_setting("IPMAN_DEBUG", False, bool), host="0.0.0.0", port=5000)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,127 @@
+# JSON encoding and response compression for the API
+# File: /api/encoding.py
+
+import gzip
+import json
+import datetime
+import ipaddress
+from decimal import Decimal
+from flask import Response
+from comm.config import env_setting
+import comm.app_logging as logging
+
+# orjson and brotli are optional; fall back to the stdlib encoder / gzip only
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Tuning knobs (environment only, read once at import)
+JSON_ENCODER = env_setting("IPMAN_JSON_ENCODER", "orjson" if orjson else "json")
+COMPRESSION_MIN_SIZE = env_setting("IPMAN_COMPRESSION_MIN_SIZE", 1024, int)
+GZIP_LEVEL = env_setting("IPMAN_GZIP_LEVEL", 5, int)
+BROTLI_QUALITY = env_setting("IPMAN_BROTLI_QUALITY", 4, int)
+
+_IP_TYPES = (
+    ipaddress.IPv4Address,
+    ipaddress.IPv6Address,
+    ipaddress.IPv4Network,
+    ipaddress.IPv6Network,
+    ipaddress.IPv4Interface,
+    ipaddress.IPv6Interface,
+)
+
+
+# Fallback for types that neither encoder handles natively
+def _default(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, _IP_TYPES):
+        return str(value)
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _encode_stdlib(payload):
+    return json.dumps(payload, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def _encode_orjson(payload):
+    # orjson serialises datetimes natively (ISO 8601) and calls _default for the rest
+    return orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+# Registry of available encoders, keyed by the name used in IPMAN_JSON_ENCODER
+ENCODERS = {"json": _encode_stdlib}
+if orjson is not None:
+    ENCODERS["orjson"] = _encode_orjson
+
+
+def register_encoder(name, encoder):
+    """Register an encoder: a callable taking a payload and returning UTF-8 bytes."""
+    ENCODERS[name] = encoder
+
+
+def get_encoder(name=None):
+    name = name or JSON_ENCODER
+    encoder = ENCODERS.get(name)
+    if encoder is None:
+        logger.warning(f"Unknown JSON encoder '{name}', falling back to stdlib json.")
+        return _encode_stdlib
+    return encoder
+
+
+def encode_json(payload, encoder=None):
+    return get_encoder(encoder)(payload)
+
+
+# Pick the best encoding the client accepts (brotli preferred over gzip)
+def _negotiate_encoding(accept_encoding):
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.partition(";")
+        if params.replace(" ", "").lower() in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if name.strip():
+            accepted.add(name.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compress_body(body, accept_encoding, min_size=None):
+    """Return (body, content_encoding); bodies under min_size are left as-is."""
+    min_size = COMPRESSION_MIN_SIZE if min_size is None else min_size
+    if min_size < 0 or len(body) < min_size:
+        return body, None
+    encoding = _negotiate_encoding(accept_encoding)
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+    return body, None
+
+
+def json_response(payload, status=200, request=None):
+    """Build a Flask response, compressing it when the request allows it."""
+    body = encode_json(payload)
+    content_encoding = None
+    if request is not None:
+        body, content_encoding = compress_body(
+            body, request.headers.get("Accept-Encoding")
+        )
+    response = Response(body, status=status, mimetype="application/json")
+    response.headers["Vary"] = "Accept-Encoding"
+    if content_encoding:
+        response.headers["Content-Encoding"] = content_encoding
+    return response
@@ -0,0 +1,180 @@
+# Health subsystem: dependencies are probed in the background, probes answer from memory
+# File: /api/health.py
+#
+# A daemon thread per worker process checks the database and Consul every
+# interval and keeps the last result of each check. The liveness, readiness and
+# legacy /health endpoints only read that result (plus the in-memory connection
+# pool counters), so orchestrator probes never wait on the network and cannot
+# pile up sessions under load.
+
+import os
+import time
+import threading
+import comm.app_logging as logging
+from sqlalchemy import create_engine
+from sqlalchemy.sql import text
+import database.db as db
+from comm.config import Config, env_setting
+
+logger = logging.getLogger(__name__)
+
+# Seconds a database probe may spend connecting, and then running its query
+PROBE_TIMEOUT = env_setting("IPMAN_HEALTH_PROBE_TIMEOUT", 2, int)
+
+_probe_engine = None
+_probe_engine_lock = threading.Lock()
+
+
+# A one-connection engine of its own: the probe never waits on an exhausted
+# request pool, and connecting or querying a hung server times out
+def probe_engine():
+    global _probe_engine
+    if _probe_engine is None:
+        with _probe_engine_lock:
+            if _probe_engine is None:
+                _probe_engine = create_engine(
+                    db.get_database_url(),
+                    pool_size=1,
+                    max_overflow=0,
+                    pool_pre_ping=True,
+                    connect_args={
+                        "connect_timeout": PROBE_TIMEOUT,
+                        "options": f"-c statement_timeout={PROBE_TIMEOUT * 1000}",
+                    },
+                )
+    return _probe_engine
+
+
+def probe_database():
+    with probe_engine().connect() as connection:
+        if connection.execute(text("SELECT 1")).scalar() != 1:
+            raise RuntimeError("SELECT 1 returned no result")
+
+
+def probe_consul():
+    if not Config().consul_client.status.leader():
+        raise RuntimeError("no cluster leader")
+
+
+# Connection pool counters of the primary engine (None until the engine exists)
+def pool_stats():
+    engine = db.engine
+    if engine is None or not hasattr(engine.pool, "checkedout"):
+        return None
+    pool = engine.pool
+    capacity = pool.size() + max(0, getattr(pool, "_max_overflow", 0))
+    checked_out = pool.checkedout()
+    return {
+        "size": pool.size(),
+        "checkedOut": checked_out,
+        "idle": pool.checkedin(),
+        "capacity": capacity,
+        "saturation": round(checked_out / capacity, 3) if capacity else None,
+    }
+
+
+class HealthMonitor:
+    """Background checks of named dependencies, cached in memory.
+
+    probes maps a dependency name to a callable that raises when it is down.
+    Only the dependencies listed in required decide readiness; the others are
+    reported but do not take the worker out of rotation.
+    """
+
+    def __init__(self, probes, required=(), interval=2.0, max_age=10.0):
+        self.probes = probes
+        self.required = tuple(required)
+        self.interval = interval
+        self.max_age = max_age
+        self.started_at = time.time()
+        self._results = None
+        self._checked_at = 0.0
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._check_lock = threading.Lock()
+
+    # Start the probe thread once per process (threads do not survive Gunicorn's preload fork)
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            thread = threading.Thread(target=self._run, name="ipman-health", daemon=True)
+            thread.start()
+
+    def _probe(self, name, probe):
+        started = time.perf_counter()
+        try:
+            probe()
+            result = {"status": "up"}
+        except Exception as e:
+            result = {"status": "down", "error": str(e)}
+        result["latencyMs"] = round((time.perf_counter() - started) * 1000, 2)
+        result["checkedAt"] = time.time()
+        return result
+
+    def check(self):
+        with self._check_lock:
+            return self._check()
+
+    def _check(self):
+        previous = self._results or {}
+        results = {name: self._probe(name, probe) for name, probe in self.probes.items()}
+        # Log state changes only, not every failed probe
+        for name, result in results.items():
+            if result["status"] != previous.get(name, {}).get("status", "up"):
+                if result["status"] == "down":
+                    logger.error(f"Health probe '{name}' failed: {result['error']}")
+                else:
+                    logger.info(f"Health probe '{name}' recovered.")
+        # Swap the whole dict so readers never see a partial update
+        self._results = results
+        self._checked_at = time.monotonic()
+        return results
+
+    def _run(self):
+        while True:
+            self.check()
+            time.sleep(self.interval)
+
+    def results(self):
+        """Last probe results; the very first call waits for one synchronous check."""
+        self.ensure_started()
+        if self._results is None:
+            with self._check_lock:
+                if self._results is None:
+                    return self._check()
+        return self._results
+
+    def age(self):
+        return time.monotonic() - self._checked_at
+
+    # The last results are too old to vouch for anything
+    def stale(self):
+        return self.age() > self.max_age
+
+    # Whether a dependency was up at a check that is still recent
+    def healthy(self, name):
+        return self.results()[name]["status"] == "up" and not self.stale()
+
+    def liveness(self):
+        # The process answers requests; dependencies do not matter here
+        self.ensure_started()
+        return {"status": "alive", "pid": os.getpid(), "uptime": round(time.time() - self.started_at, 1)}, 200
+
+    def readiness(self):
+        results = self.results()
+        age = self.age()
+        stale = self.stale()
+        ready = not stale and all(results[name]["status"] == "up" for name in self.required)
+        body = {
+            "status": "ready" if ready else "unready",
+            "checks": results,
+            "lastCheckAge": round(age, 3),
+            "pool": pool_stats(),
+        }
+        if stale:
+            body["error"] = "health checks are stale"
+        return body, 200 if ready else 503
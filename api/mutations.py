@@ -0,0 +1,201 @@
+# Bulk GraphQL mutations, executed as set-based statements on the primary
+# File: /api/mutations.py
+
+import hmac
+from functools import wraps
+from ariadne import MutationType, convert_kwargs_to_snake_case
+from graphql import GraphQLError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import func
+from database.db import session_scope
+from database.bulk import (
+    SelectorError,
+    selector_clause,
+    bulk_create,
+    bulk_update,
+    bulk_set_status,
+    bulk_reassign,
+)
+from database.filters import FilterError
+from api.resolvers import validate_ip_and_range
+from comm.config import env_setting
+import comm.app_logging as logging
+
+# Initialize the logger for this module
+logger = logging.getLogger(__name__)
+
+# Initialize a mutation type for GraphQL mutations
+mutation = MutationType()
+
+IP_STATUSES = ("active", "inactive")
+
+# Writes are off unless explicitly enabled; with a token, callers must also send
+# "Authorization: Bearer <token>"
+MUTATIONS_ENABLED = env_setting("IPMAN_ENABLE_MUTATIONS", False, bool)
+MUTATION_TOKEN = env_setting("IPMAN_MUTATION_TOKEN")
+
+
+def _check_write_access(info):
+    if not MUTATIONS_ENABLED:
+        raise GraphQLError("Mutations are disabled on this server.")
+    if MUTATION_TOKEN:
+        request = info.context.get("request") if isinstance(info.context, dict) else None
+        header = request.headers.get("Authorization", "") if request is not None else ""
+        scheme, _, token = header.partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip(), MUTATION_TOKEN):
+            logger.warning("Rejected a mutation without a valid token.")
+            raise GraphQLError("Not authorized to run mutations.")
+
+
+def requires_write_access(resolver):
+    @wraps(resolver)
+    def wrapper(obj, info, **kwargs):
+        _check_write_access(info)
+        return resolver(obj, info, **kwargs)
+
+    return wrapper
+
+
+def _validate_status(status):
+    if status not in IP_STATUSES:
+        raise GraphQLError(f"Status must be one of {', '.join(IP_STATUSES)}.")
+
+
+def _service_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise GraphQLError(f"'{value}' is not a valid service ID.")
+
+
+# Compile a GraphQL IPSelector into a SQL condition
+def _selector(selector):
+    try:
+        return selector_clause(
+            ids=selector.get("ids"),
+            cidr=selector.get("cidr"),
+            service_id=selector.get("service_id"),
+        )
+    except (SelectorError, FilterError, ValueError) as e:
+        raise GraphQLError(str(e))
+
+
+# Run a bulk write in its own transaction on the primary (never on a read replica)
+def _run_in_transaction(action, description):
+    with session_scope() as session:
+        try:
+            result = action(session)
+            session.commit()
+            return result
+        except IntegrityError as e:
+            session.rollback()
+            logger.error(f"{description} violated a constraint: {e}")
+            raise GraphQLError(f"{description} failed: a referenced service does not exist or a constraint was violated.")
+        except GraphQLError:
+            session.rollback()
+            raise
+        except Exception as e:
+            session.rollback()
+            logger.error(f"{description} failed: {e}")
+            raise GraphQLError(f"{description} failed.")
+
+
+@mutation.field("createIPAddresses")
+@requires_write_access
+@convert_kwargs_to_snake_case
+def resolve_create_ip_addresses(_, info, inputs):
+    rows = []
+    for item in inputs:
+        validate_ip_and_range(
+            item.get("ip_address"), item.get("range_start"), item.get("range_end"), item.get("ip_range")
+        )
+        status = item.get("status") or "active"
+        _validate_status(status)
+        rows.append(
+            {
+                "ip_address": item.get("ip_address"),
+                "ip_range": item.get("ip_range"),
+                "range_start": item.get("range_start"),
+                "range_end": item.get("range_end"),
+                "service_id": _service_id(item["service_id"]),
+                "status": status,
+                "created_at": func.now(),
+                "updated_at": func.now(),
+                "deactivated_at": func.now() if status == "inactive" else None,
+            }
+        )
+    if not rows:
+        return {"affected": 0, "ids": []}
+    ids = _run_in_transaction(lambda session: bulk_create(session, rows), "Creating IP addresses")
+    return {"affected": len(ids), "ids": ids}
+
+
+@mutation.field("updateIPAddresses")
+@requires_write_access
+@convert_kwargs_to_snake_case
+def resolve_update_ip_addresses(_, info, selector, changes):
+    values = {}
+    if changes.get("service_id") is not None:
+        values["service_id"] = _service_id(changes["service_id"])
+    if changes.get("status") is not None:
+        _validate_status(changes["status"])
+        values["status"] = changes["status"]
+    if not values:
+        raise GraphQLError("No changes given.")
+    clause = _selector(selector)
+    # One UPDATE for all changes: a second statement would no longer match rows
+    # the first one moved out of a serviceId selector
+    affected = _run_in_transaction(
+        lambda session: bulk_update(session, clause, values), "Updating IP addresses"
+    )
+    return {"affected": affected, "ids": None}
+
+
+@mutation.field("activateIPAddresses")
+@requires_write_access
+@convert_kwargs_to_snake_case
+def resolve_activate_ip_addresses(_, info, selector):
+    clause = _selector(selector)
+    affected = _run_in_transaction(
+        lambda session: bulk_set_status(session, clause, "active"), "Activating IP addresses"
+    )
+    return {"affected": affected, "ids": None}
+
+
+@mutation.field("deactivateIPAddresses")
+@requires_write_access
+@convert_kwargs_to_snake_case
+def resolve_deactivate_ip_addresses(_, info, selector):
+    clause = _selector(selector)
+    affected = _run_in_transaction(
+        lambda session: bulk_set_status(session, clause, "inactive"), "Deactivating IP addresses"
+    )
+    return {"affected": affected, "ids": None}
+
+
+@mutation.field("reassignService")
+@requires_write_access
+@convert_kwargs_to_snake_case
+def resolve_reassign_service(_, info, selector, service_id):
+    clause = _selector(selector)
+    service_id = _service_id(service_id)
+    affected = _run_in_transaction(
+        lambda session: bulk_reassign(session, clause, service_id), "Reassigning IP addresses"
+    )
+    return {"affected": affected, "ids": None}
+
+
+# Snapshot mode is read-only: every mutation is rejected
+def resolve_read_only(*_, **__):
+    raise GraphQLError("Mutations are not available when serving from a snapshot.")
+
+
+snapshot_mutation = MutationType()
+for field_name in (
+    "createIPAddresses",
+    "updateIPAddresses",
+    "activateIPAddresses",
+    "deactivateIPAddresses",
+    "reassignService",
+):
+    snapshot_mutation.set_field(field_name, resolve_read_only)
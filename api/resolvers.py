@@ -1,13 +1,17 @@
 # File: /src/graphql_api/resolvers.py
 
 import ipaddress
-from ariadne import QueryType
+from ariadne import QueryType, convert_kwargs_to_snake_case
 from graphql import GraphQLError
 from sqlalchemy.orm import joinedload
 from sqlalchemy.sql import func
 from ipaddress import ip_network
 from database.models import IPAddress, Service
-from database.db import get_db_session
+from database.filters import IPFilter, ServiceFilter, FilterError
+from database.validation import range_error
+from database.history import parse_as_of, find_version_at, version_to_dict
+from contextlib import contextmanager
+from database.db import read_session_scope
 import comm.app_logging as logging
 
 # Initialize the logger for this module
@@ -16,6 +20,20 @@ logger = logging.getLogger(__name__)
 # Initialize a query type for GraphQL queries
 query = QueryType()
 
+# Reuse the request-scoped session from the context (batched requests share it)
+@contextmanager
+def context_session(info):
+    session = info.context.get("session") if isinstance(info.context, dict) else None
+    if session is not None:
+        yield session
+    else:
+        with read_session_scope() as session:
+            yield session
+
+# Shared-memory snapshot of the dataset, when the lookup cache is enabled and fresh
+def context_lookup_cache(info):
+    return info.context.get("lookup_cache") if isinstance(info.context, dict) else None
+
 # Helper function to convert Service model to dictionary (without including IPs)
 def service_to_dict(service, include_ips=False):
     return {
@@ -49,34 +67,32 @@ def ip_to_dict(ip, include_service=True):
         ),
     }
 
-# Validator for IP address and range
-def validate_ip_and_range(ip_address, range_start, range_end):
-    if not ip_address and not (range_start and range_end):
+# Validator for IP address and range (ip_range is already checked by the CIDR scalar)
+def validate_ip_and_range(ip_address, range_start, range_end, ip_range=None):
+    if not ip_address and not ip_range and not (range_start and range_end):
         raise GraphQLError(
-            "You must provide either a single IP address or a valid range (start and end)."
+            "You must provide a single IP address, a CIDR range or a valid range (start and end)."
         )
     if ip_address:
         try:
-            ip = ipaddress.ip_address(ip_address)
+            ipaddress.ip_address(ip_address)
         except ValueError:
             raise GraphQLError(f"'{ip_address}' is not a valid IP address.")
-    if range_start and range_end:
-        try:
-            start_ip = ipaddress.ip_address(range_start)
-            end_ip = ipaddress.ip_address(range_end)
-            if start_ip > end_ip:
-                raise GraphQLError("Range start cannot be greater than range end.")
-        except ValueError:
-            raise GraphQLError(
-                f"'{range_start}' or '{range_end}' is not a valid IP address."
-            )
+    error = range_error(range_start, range_end)
+    if error:
+        raise GraphQLError(error)
 
 # Resolver for fetching all services
 @query.field("services")
-def resolve_services(*_):
+@convert_kwargs_to_snake_case
+def resolve_services(_, info, **filters):
+    try:
+        service_filter = ServiceFilter(**filters)
+    except FilterError as e:
+        raise GraphQLError(str(e))
     try:
-        with next(get_db_session()) as session:
-            services = session.query(Service).all()
+        with context_session(info) as session:
+            services = service_filter.apply(session.query(Service)).all()
             logger.info("Successfully fetched all services.")
             return [service_to_dict(service) for service in services]
     except Exception as e:
@@ -103,7 +119,12 @@ def resolve_ip_by_cidr(_, info, cidr):
         logger.error(f"Invalid CIDR input: {cidr}")
         raise GraphQLError(f"'{cidr}' is not a valid CIDR format.")
 
-    with next(get_db_session()) as session:
+    lookup_cache = context_lookup_cache(info)
+    if lookup_cache is not None:
+        network = ip_network(cidr_network)
+        return [lookup_cache.record(idx) for idx in lookup_cache.find_within(network)]
+
+    with context_session(info) as session:
         try:
             ips = (
                 session.query(IPAddress)
@@ -119,26 +140,62 @@ def resolve_ip_by_cidr(_, info, cidr):
 
 # Resolver for fetching all IP addresses
 @query.field("ipAddresses")
-def resolve_ips(*_):
+@convert_kwargs_to_snake_case
+def resolve_ips(_, info, **filters):
+    try:
+        ip_filter = IPFilter(**filters)
+    except FilterError as e:
+        raise GraphQLError(str(e))
     try:
-        with next(get_db_session()) as session:
-            ips = session.query(IPAddress).options(joinedload(IPAddress.service)).all()
+        with context_session(info) as session:
+            ips = (
+                ip_filter.apply(session.query(IPAddress))
+                .options(joinedload(IPAddress.service))
+                .all()
+            )
             logger.info("Successfully fetched all IP addresses.")
             return [ip_to_dict(ip) for ip in ips]
     except Exception as e:
         logger.error(f"Failed to fetch IP addresses: {e}")
         raise GraphQLError("Error fetching IP addresses.")
 
-# Resolver for fetching an IP by address
+# Reject ipByAddress selections of 'service' without subfields
+def check_service_selection(info, address):
+    selections = [
+        field.name.value
+        for field in info.field_nodes[0].selection_set.selections
+    ]
+    if "service" in selections and not any(
+        subfield in selections for subfield in ["id", "name", "description"]
+    ):
+        logger.warning(f"Field 'service' missing subfields for IP: {address}")
+        raise GraphQLError(
+            "Field 'service' must specify subfields like { id, name, description }."
+        )
+
+# Resolver for fetching an IP by address (as of a past time when asOf is given)
 @query.field("ipByAddress")
-def resolve_ip_by_address(_, info, address):
+@convert_kwargs_to_snake_case
+def resolve_ip_by_address(_, info, address, as_of=None):
     try:
         ip = ipaddress.ip_address(address)
     except ValueError:
         logger.error(f"Invalid IP address input: {address}")
         raise GraphQLError(f"'{address}' is not a valid IP address.")
 
-    with next(get_db_session()) as session:
+    if as_of:
+        return resolve_ip_by_address_as_of(info, ip, as_of)
+
+    lookup_cache = context_lookup_cache(info)
+    if lookup_cache is not None:
+        idx = lookup_cache.find_address(ip)
+        if idx is None:
+            logger.info(f"No IP record found for address: {address}")
+            return None
+        check_service_selection(info, address)
+        return lookup_cache.record(idx)
+
+    with context_session(info) as session:
         ip_record = (
             session.query(IPAddress)
             .filter(
@@ -153,27 +210,30 @@ def resolve_ip_by_address(_, info, address):
         )
 
         if ip_record:
-            selections = [
-                field.name.value
-                for field in info.field_nodes[0].selection_set.selections
-            ]
-            if "service" in selections and not any(
-                subfield in selections for subfield in ["id", "name", "description"]
-            ):
-                logger.warning(f"Field 'service' missing subfields for IP: {address}")
-                raise GraphQLError(
-                    "Field 'service' must specify subfields like { id, name, description }."
-                )
-
+            check_service_selection(info, address)
             return ip_to_dict(ip_record)
         else:
             logger.info(f"No IP record found for address: {address}")
             return None
 
+# Point-in-time lookup in the history table (never served from the lookup cache)
+def resolve_ip_by_address_as_of(info, ip, as_of):
+    try:
+        timestamp = parse_as_of(as_of)
+    except FilterError as e:
+        raise GraphQLError(str(e))
+    with context_session(info) as session:
+        version = find_version_at(session, ip, timestamp)
+        if version is None:
+            logger.info(f"No IP record found for address {ip} as of {as_of}")
+            return None
+        check_service_selection(info, str(ip))
+        return version_to_dict(version)
+
 # Resolver for fetching a specific service by ID, including related IP addresses
 @query.field("service")
 def resolve_service(_, info, id):
-    with next(get_db_session()) as session:
+    with context_session(info) as session:
         # Eagerly load the associated IP addresses with the service
         service = (
             session.query(Service)
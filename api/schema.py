@@ -8,12 +8,17 @@ from api.resolvers import (
     resolve_ip_by_address, 
     resolve_ip_by_cidr
 )
+from api import snapshot_resolvers
+from api.mutations import mutation, snapshot_mutation
+from api.subscriptions import subscription
 
+import datetime
 import ipaddress
 
 # Scalar for IPAddress renamed to avoid conflict
 ip_scalar = ScalarType("IPAddressScalar")
 cidr_scalar = ScalarType("CIDR")
+datetime_scalar = ScalarType("DateTime")
 
 # Define serializer and parser for IPAddress scalar
 @ip_scalar.serializer
@@ -42,6 +47,21 @@ def parse_cidr(value):
     except ValueError:
         raise ValueError(f"Invalid CIDR block: {value}")
 
+# Timestamps are sent as ISO 8601 (graphql-core's String would send str(datetime))
+@datetime_scalar.serializer
+def serialize_datetime(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+# DateTime arguments must be ISO 8601; a UTC offset (or "Z") is optional
+@datetime_scalar.value_parser
+def parse_datetime(value):
+    try:
+        return datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Invalid ISO 8601 timestamp: {value}")
+
 # Define the Query type
 query = QueryType()
 
@@ -52,15 +72,24 @@ query.set_field("ipAddresses", resolve_ips)
 query.set_field("ipByAddress", resolve_ip_by_address)
 query.set_field("ipByCIDR", resolve_ip_by_cidr)
 
+# Same queries answered from a memory-mapped snapshot (no database needed)
+snapshot_query = QueryType()
+snapshot_query.set_field("services", snapshot_resolvers.resolve_services)
+snapshot_query.set_field("service", snapshot_resolvers.resolve_service)
+snapshot_query.set_field("ipAddresses", snapshot_resolvers.resolve_ips)
+snapshot_query.set_field("ipByAddress", snapshot_resolvers.resolve_ip_by_address)
+snapshot_query.set_field("ipByCIDR", snapshot_resolvers.resolve_ip_by_cidr)
+
 # Updated GraphQL schema definition
 type_defs = """
 scalar CIDR
 scalar IPAddressScalar  
+scalar DateTime
 type Service {
     id: ID!
     name: String!
     description: String
-    createdAt: String
+    createdAt: DateTime
     ipAddresses: [IPAddress!]! 
 }
 
@@ -71,20 +100,84 @@ type IPAddress {
     rangeStart: IPAddressScalar
     rangeEnd: IPAddressScalar   
     status: String!
-    createdAt: String
-    updatedAt: String
-    deactivatedAt: String
+    createdAt: DateTime
+    updatedAt: DateTime
+    deactivatedAt: DateTime
     service: Service
 }
 
 type Query {
-    services: [Service!]!
+    services(
+        namePrefix: String
+        createdAfter: DateTime
+        createdBefore: DateTime
+    ): [Service!]!
     service(id: ID!): Service  
-    ipAddresses: [IPAddress!]!
-    ipByAddress(address: IPAddressScalar!): IPAddress 
+    ipAddresses(
+        status: String
+        serviceId: ID
+        serviceName: String
+        ipVersion: Int
+        withinCidr: CIDR
+        createdAfter: DateTime
+        createdBefore: DateTime
+        updatedAfter: DateTime
+        updatedBefore: DateTime
+    ): [IPAddress!]!
+    ipByAddress(address: IPAddressScalar!, asOf: DateTime): IPAddress
     ipByCIDR(cidr: CIDR!): [IPAddress!]  
 }
+
+input IPAddressInput {
+    ipAddress: IPAddressScalar
+    ipRange: CIDR
+    rangeStart: IPAddressScalar
+    rangeEnd: IPAddressScalar
+    serviceId: ID!
+    status: String
+}
+
+input IPSelector {
+    ids: [ID!]
+    cidr: CIDR
+    serviceId: ID
+}
+
+input IPAddressChanges {
+    serviceId: ID
+    status: String
+}
+
+type BulkResult {
+    affected: Int!
+    ids: [ID!]
+}
+
+type Mutation {
+    createIPAddresses(inputs: [IPAddressInput!]!): BulkResult!
+    updateIPAddresses(selector: IPSelector!, changes: IPAddressChanges!): BulkResult!
+    activateIPAddresses(selector: IPSelector!): BulkResult!
+    deactivateIPAddresses(selector: IPSelector!): BulkResult!
+    reassignService(selector: IPSelector!, serviceId: ID!): BulkResult!
+}
+
+type IPChange {
+    ip: IPAddress!
+    previousStatus: String
+    previousServiceId: ID
+    changedAt: DateTime
+}
+
+type Subscription {
+    ipStatusChanged(serviceId: ID): IPChange!
+    ipAssignmentChanged(serviceId: ID): IPChange!
+}
 """
 
 # Create executable schema
-schema = make_executable_schema(type_defs, query, ip_scalar, cidr_scalar)
+schema = make_executable_schema(
+    type_defs, query, mutation, subscription, ip_scalar, cidr_scalar, datetime_scalar
+)
+snapshot_schema = make_executable_schema(
+    type_defs, snapshot_query, snapshot_mutation, subscription, ip_scalar, cidr_scalar, datetime_scalar
+)
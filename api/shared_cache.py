@@ -0,0 +1,108 @@
+# Lookup cache shared by all Gunicorn workers of a node through shared memory
+# File: /api/shared_cache.py
+#
+# The cache is a snapshot file (database/snapshot.py) on a tmpfs such as
+# /dev/shm. Every worker maps the same file, so the dataset is held once per
+# node no matter how many workers run. One worker per node wins a file lock
+# and becomes the refresher: it polls the change counter maintained by
+# database/sql/005_data_version.sql and rewrites the snapshot (atomic rename,
+# new generation) when it moved, and in any case once rebuild_interval has
+# passed. The refresher also touches the lock file on every poll; readers
+# stop using the cache if that heartbeat gets older than max_age, e.g. when
+# the refresher cannot reach the database.
+
+import os
+import time
+import fcntl
+import threading
+import comm.app_logging as logging
+from sqlalchemy.sql import text
+from database.snapshot import SnapshotStore, build_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Incremented by every committed write to ipman.services or ipman.ip_addresses
+VERSION_QUERY = text("SELECT version FROM ipman.data_version")
+
+
+class SharedLookupCache:
+    def __init__(self, path, session_scope, refresh_interval=5.0, max_age=30.0, rebuild_interval=300.0):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.session_scope = session_scope
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.rebuild_interval = rebuild_interval
+        self.store = SnapshotStore(path, reload_interval=min(1.0, refresh_interval))
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._lock_file = None
+        self._version = None
+        self._built_at = 0.0
+        self._heartbeat = 0.0
+        self._heartbeat_checked_at = 0.0
+
+    # Start the refresher thread once per process (safe to call on every request,
+    # and after a fork, since threads do not survive Gunicorn's preload fork)
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._lock_file = None
+            thread = threading.Thread(target=self._run, name="ipman-shared-cache", daemon=True)
+            thread.start()
+
+    def _try_become_refresher(self):
+        lock_file = open(self.lock_path, "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        logger.info(f"Process {os.getpid()} is the shared cache refresher.")
+        return True
+
+    def _refresh(self):
+        with self.session_scope() as session:
+            # Read the counter first: a change committed during the build moves it again
+            version = session.execute(VERSION_QUERY).scalar()
+            if (
+                version != self._version
+                or time.monotonic() - self._built_at >= self.rebuild_interval
+                or not os.path.exists(self.path)
+            ):
+                build_snapshot(session, self.path)
+                self._version = version
+                self._built_at = time.monotonic()
+                logger.info(f"Shared lookup cache rebuilt at data version {version}.")
+        os.utime(self.lock_path)  # Heartbeat for the readers
+
+    def _run(self):
+        while True:
+            try:
+                if self._lock_file is not None or self._try_become_refresher():
+                    self._refresh()
+            except Exception as e:
+                logger.error(f"Shared cache refresh failed: {e}")
+            time.sleep(self.refresh_interval)
+
+    def _is_fresh(self):
+        now = time.time()
+        if now - self._heartbeat_checked_at >= 1.0:
+            self._heartbeat_checked_at = now
+            try:
+                self._heartbeat = os.stat(self.lock_path).st_mtime
+            except OSError:
+                self._heartbeat = 0.0
+        return now - self._heartbeat <= self.max_age
+
+    def reader(self):
+        """The current snapshot, or None when the cache is missing or stale."""
+        self.ensure_started()
+        if not self._is_fresh():
+            return None
+        return self.store.get()
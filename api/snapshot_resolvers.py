@@ -0,0 +1,83 @@
+# Resolvers that answer queries from a memory-mapped snapshot instead of the database
+# File: /api/snapshot_resolvers.py
+
+import ipaddress
+from ariadne import convert_kwargs_to_snake_case
+from graphql import GraphQLError
+from database.filters import IPFilter, ServiceFilter, FilterError
+import comm.app_logging as logging
+
+# Initialize the logger for this module
+logger = logging.getLogger(__name__)
+
+
+# The reader is taken once per request, so a reload never changes data mid-request
+def context_snapshot(info):
+    snapshot = info.context.get("snapshot") if isinstance(info.context, dict) else None
+    if snapshot is None:
+        logger.error("No snapshot loaded, cannot serve the query.")
+        raise GraphQLError("Snapshot not available.")
+    return snapshot
+
+
+# Resolver for fetching all services
+@convert_kwargs_to_snake_case
+def resolve_services(_, info, **filters):
+    try:
+        service_filter = ServiceFilter(**filters)
+    except FilterError as e:
+        raise GraphQLError(str(e))
+    snapshot = context_snapshot(info)
+    return [service for service in snapshot.services() if service_filter.matches(service)]
+
+
+# Resolver for fetching a specific service by ID, including related IP addresses
+def resolve_service(_, info, id):
+    snapshot = context_snapshot(info)
+    idx = snapshot.find_service(int(id))
+    if idx is None:
+        raise GraphQLError(f"Service with ID {id} not found")
+    return snapshot.service(idx, include_ips=True)
+
+
+# Resolver for fetching all IP addresses
+@convert_kwargs_to_snake_case
+def resolve_ips(_, info, **filters):
+    try:
+        ip_filter = IPFilter(**filters)
+    except FilterError as e:
+        raise GraphQLError(str(e))
+    snapshot = context_snapshot(info)
+    return [ip for ip in snapshot.records() if ip_filter.matches(ip)]
+
+
+# Resolver for fetching an IP by address
+@convert_kwargs_to_snake_case
+def resolve_ip_by_address(_, info, address, as_of=None):
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        logger.error(f"Invalid IP address input: {address}")
+        raise GraphQLError(f"'{address}' is not a valid IP address.")
+    if as_of:
+        # History lives in the database only
+        raise GraphQLError("asOf lookups are not available when serving from a snapshot.")
+
+    snapshot = context_snapshot(info)
+    idx = snapshot.find_address(ip)
+    if idx is None:
+        logger.info(f"No IP record found for address: {address}")
+        return None
+    return snapshot.record(idx)
+
+
+# Resolver for IPAddress based on CIDR
+def resolve_ip_by_cidr(_, info, cidr):
+    try:
+        network = ipaddress.ip_network(cidr, strict=False)
+    except ValueError:
+        logger.error(f"Invalid CIDR input: {cidr}")
+        raise GraphQLError(f"'{cidr}' is not a valid CIDR format.")
+
+    snapshot = context_snapshot(info)
+    return [snapshot.record(idx) for idx in snapshot.find_within(network)]
@@ -0,0 +1,265 @@
+# GraphQL subscriptions pushed over Server-Sent Events, fed by Postgres LISTEN/NOTIFY
+# File: /api/subscriptions.py
+#
+# Triggers on ipman.ip_addresses (database/sql/004_ip_change_notify.sql) NOTIFY
+# the ids of the rows whose status or service changed, once per write
+# statement (in chunks of 100 rows). Each worker process holds one LISTEN
+# connection to the primary, in a background thread. Per notification it loads
+# the current rows with one query and puts the batch of changes on the bounded
+# queue of every subscriber. Per change, each subscriber's selection runs
+# against the change as root value, so subscribers never query the database.
+import json
+import queue
+import select
+import threading
+import os
+import time
+from ariadne import ObjectType
+from graphql import FieldNode, GraphQLError, OperationType, execute, parse, validate
+from graphql.execution.values import get_argument_values
+import comm.app_logging as logging
+from database.db import get_database_url
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "ipman_ip_changes"
+
+# Subscription fields: the root value of each execution is the change itself
+subscription = ObjectType("Subscription")
+
+
+@subscription.field("ipStatusChanged")
+@subscription.field("ipAssignmentChanged")
+def resolve_change(change, info, **_):
+    return change
+
+
+# Current state of the IP records listed in a notification, one query per notification
+CHANGED_ROWS_QUERY = """
+    SELECT a.id, host(a.ip_address), a.ip_range::text, host(a.range_start), host(a.range_end),
+           a.status, a.service_id, s.name, a.created_at, a.updated_at, a.deactivated_at
+    FROM ipman.ip_addresses a
+    LEFT JOIN ipman.services s ON s.id = a.service_id
+    WHERE a.id = ANY(%s)
+"""
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+# Convert a NOTIFY payload and the rows it refers to into IPChange values
+def changes_from_notification(payload, rows):
+    data = json.loads(payload)
+    by_id = {row[0]: row for row in rows}
+    changes = []
+    for ip_id, previous_status, previous_service_id, status_changed, service_changed in data["changes"]:
+        row = by_id.get(ip_id)
+        if row is None:
+            # Deleted before the notification was read
+            continue
+        _, ip_address, ip_range, range_start, range_end, status, service_id, service_name = row[:8]
+        created_at, updated_at, deactivated_at = row[8:]
+        changes.append(
+            {
+                "ip": {
+                    "id": ip_id,
+                    "ipAddress": ip_address,
+                    "ipRange": ip_range,
+                    "rangeStart": range_start,
+                    "rangeEnd": range_end,
+                    "status": status,
+                    "createdAt": _isoformat(created_at),
+                    "updatedAt": _isoformat(updated_at),
+                    "deactivatedAt": _isoformat(deactivated_at),
+                    "service": (
+                        {
+                            "id": service_id,
+                            "name": service_name,
+                            "description": None,
+                            "createdAt": None,
+                            "ipAddresses": [],
+                        }
+                        if service_id is not None
+                        else None
+                    ),
+                },
+                "previousStatus": previous_status,
+                "previousServiceId": previous_service_id,
+                "changedAt": data.get("changedAt"),
+                "statusChanged": bool(status_changed),
+                "serviceChanged": bool(service_changed),
+            }
+        )
+    return changes
+
+
+# Ids listed in a NOTIFY payload
+def notification_ids(payload):
+    return [change[0] for change in json.loads(payload)["changes"]]
+
+
+def _same_service(value, service_id):
+    return value is not None and str(value) == str(service_id)
+
+
+# Which changes a subscription field with the given arguments receives
+def change_matcher(field_name, args):
+    service_id = args.get("serviceId")
+    if field_name == "ipStatusChanged":
+        return lambda change: change["statusChanged"] and (
+            service_id is None
+            or _same_service(change["ip"]["service"] and change["ip"]["service"]["id"], service_id)
+        )
+    if field_name == "ipAssignmentChanged":
+        return lambda change: change["serviceChanged"] and (
+            service_id is None
+            or _same_service(change["previousServiceId"], service_id)
+            or _same_service(change["ip"]["service"] and change["ip"]["service"]["id"], service_id)
+        )
+    raise GraphQLError(f"Unknown subscription field '{field_name}'.")
+
+
+class PreparedSubscription:
+    """A validated subscription operation, executed once per matching change."""
+
+    def __init__(self, schema, query, variables=None, operation_name=None):
+        try:
+            self.document = parse(query or "")
+        except GraphQLError as e:
+            raise GraphQLError(f"Syntax error: {e.message}")
+        errors = validate(schema, self.document)
+        if errors:
+            raise GraphQLError(errors[0].message)
+        operations = [
+            definition
+            for definition in self.document.definitions
+            if getattr(definition, "operation", None) is not None
+            and (operation_name is None or (definition.name and definition.name.value == operation_name))
+        ]
+        if len(operations) != 1:
+            raise GraphQLError("Provide exactly one subscription operation (use operationName).")
+        operation = operations[0]
+        if operation.operation != OperationType.SUBSCRIPTION:
+            raise GraphQLError("Only subscription operations can be streamed.")
+        field_node = operation.selection_set.selections[0]
+        if not isinstance(field_node, FieldNode):
+            raise GraphQLError("Select the subscription field directly, not through a fragment.")
+        field_name = field_node.name.value
+        field_def = schema.subscription_type.fields[field_name]
+        self.schema = schema
+        self.variables = variables or {}
+        self.operation_name = operation_name
+        self.matches = change_matcher(field_name, get_argument_values(field_def, field_node, self.variables))
+
+    def execute(self, change):
+        result = execute(
+            self.schema,
+            self.document,
+            root_value=change,
+            variable_values=self.variables,
+            operation_name=self.operation_name,
+        )
+        payload = {"data": result.data}
+        if result.errors:
+            payload["errors"] = [{"message": error.message, "path": error.path} for error in result.errors]
+        return payload
+
+
+# Each queue entry is the list of changes of one notification (up to 100)
+class Subscriber:
+    def __init__(self, max_queue):
+        self.events = queue.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+
+class ChangeListener:
+    """One LISTEN connection per process, fanning changes out to subscribers."""
+
+    def __init__(self, max_subscribers=100, max_queue=1000, reconnect_delay=1.0):
+        self.max_subscribers = max_subscribers
+        self.max_queue = max_queue
+        self.reconnect_delay = reconnect_delay
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    # Start the listener thread once per process (threads do not survive Gunicorn's preload fork)
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._subscribers = set()
+            thread = threading.Thread(target=self._run, name="ipman-change-listener", daemon=True)
+            thread.start()
+
+    def subscribe(self):
+        """Register a subscriber, or return None when the process is at capacity."""
+        self.ensure_started()
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            subscriber = Subscriber(self.max_queue)
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    # Queue one batch of changes (one notification) for every subscriber
+    def publish(self, changes):
+        if not changes:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.events.put_nowait(changes)
+            except queue.Full:
+                # A consumer that cannot keep up is disconnected rather than slowing everyone down
+                subscriber.overflowed = True
+                self.unsubscribe(subscriber)
+
+    def _listen(self):
+        # Imported here: snapshot-only nodes never listen and may lack the driver
+        import psycopg2
+        import psycopg2.extensions
+
+        conn = psycopg2.connect(get_database_url())
+        try:
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            logger.info(f"Listening for IP changes on channel {CHANNEL}.")
+            while True:
+                if select.select([conn], [], [], 30.0) == ([], [], []):
+                    # Idle: make sure the connection is still alive
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    try:
+                        ids = notification_ids(notify.payload)
+                    except (ValueError, KeyError, IndexError, TypeError) as e:
+                        logger.error(f"Ignoring malformed IP change notification: {e}")
+                        continue
+                    with conn.cursor() as cursor:
+                        cursor.execute(CHANGED_ROWS_QUERY, (ids,))
+                        rows = cursor.fetchall()
+                    self.publish(changes_from_notification(notify.payload, rows))
+        finally:
+            conn.close()
+
+    def _run(self):
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                logger.error(f"IP change listener failed, reconnecting: {e}")
+            time.sleep(self.reconnect_delay)
@@ -35,5 +35,42 @@ class Config:
     def DB_PASSWORD(self):
         return self.get_config("ipman_db_password")
 
+    @property
+    def DB_REPLICA_HOSTS(self):
+        # Comma separated list of "host" or "host:port" entries
+        return self.get_config("ipman_db_replica_hosts")
+
     def get_db_url(self):
         return f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+
+    def get_replica_urls(self):
+        # An explicit list of URLs in the environment wins over Consul
+        urls = os.getenv("IPMAN_DB_REPLICA_URLS")
+        if urls:
+            return [url.strip() for url in urls.split(",") if url.strip()]
+        hosts = self.DB_REPLICA_HOSTS
+        if not hosts:
+            return []
+        replica_urls = []
+        for entry in hosts.split(","):
+            entry = entry.strip()
+            if not entry:
+                continue
+            host, _, port = entry.partition(":")
+            replica_urls.append(
+                f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}@{host}:{port or self.DB_PORT}/{self.DB_NAME}"
+            )
+        return replica_urls
+
+
+# Helper for tuning knobs that are read from the environment (no Consul round trip)
+def env_setting(name, default=None, cast=str):
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    if cast is bool:
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    try:
+        return cast(value)
+    except ValueError:
+        return default
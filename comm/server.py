@@ -0,0 +1,176 @@
+# Production server launcher for the API and the web app (Gunicorn)
+# File: /comm/server.py
+#
+# Usage: python -m comm.server api|web [--worker-class sync|gthread|gevent]
+#                                     [--workers N] [--threads N] [--bind HOST:PORT]
+#
+# Every setting can also come from the environment (flags win), so one image
+# can be tuned per node. Worker and thread counts default to values derived
+# from the CPUs actually available to the container. The app is preloaded in
+# the master so workers fork with the code already imported. Database engines
+# are created lazily, so no connection is shared across the fork. Workers are
+# recycled after a jittered number of requests to cap slow memory growth
+# without restarting them all at once.
+
+import os
+import sys
+import argparse
+import comm.app_logging as logging
+from comm.config import env_setting
+
+logger = logging.getLogger(__name__)
+
+APPS = {
+    # The API defaults to threads: subscription streams hold a thread for as long as they are open
+    "api": {"target": "api.app:api_app", "bind": "0.0.0.0:5000", "worker_class": "gthread", "threads": 8},
+    "web": {"target": "web.app:web_app", "bind": "0.0.0.0:5001", "worker_class": "sync", "threads": 4},
+}
+
+WORKER_CLASSES = ("sync", "gthread", "gevent")
+
+
+# CPUs usable by this process: affinity mask, capped by a cgroup v2 CPU quota
+def cpu_count():
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            count = min(count, max(1, int(-(-int(quota) // int(period)))))
+    except (OSError, ValueError):
+        pass
+    return max(1, count)
+
+
+def gevent_available():
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def server_options(app_name, worker_class=None, workers=None, threads=None, bind=None):
+    """Gunicorn settings for an app, from explicit values, the environment and the CPU count."""
+    cpus = cpu_count()
+    worker_class = worker_class or env_setting("IPMAN_WORKER_CLASS", APPS[app_name]["worker_class"])
+    if worker_class not in WORKER_CLASSES:
+        raise ValueError(f"Unknown worker class '{worker_class}', expected one of {', '.join(WORKER_CLASSES)}.")
+    if worker_class == "gevent" and not gevent_available():
+        logger.warning("gevent is not installed, falling back to gthread workers.")
+        worker_class = "gthread"
+
+    # sync: one request per process, so more processes than CPUs to cover I/O waits
+    # gthread: fewer processes, each serving several requests from a thread pool
+    # gevent: one process per CPU, concurrency comes from greenlets
+    default_workers = {"sync": 2 * cpus + 1, "gthread": cpus + 1, "gevent": cpus}[worker_class]
+    workers = workers or env_setting("IPMAN_WORKERS", default_workers, int)
+    default_threads = APPS[app_name]["threads"] if worker_class == "gthread" else 1
+    threads = threads or env_setting("IPMAN_THREADS", default_threads, int)
+
+    max_requests = env_setting("IPMAN_MAX_REQUESTS", 1000, int)
+    options = {
+        "bind": bind or env_setting("IPMAN_BIND", APPS[app_name]["bind"]),
+        "worker_class": worker_class,
+        "workers": workers,
+        "threads": threads if worker_class == "gthread" else 1,
+        "worker_connections": env_setting("IPMAN_WORKER_CONNECTIONS", 100, int),
+        "max_requests": max_requests,
+        "max_requests_jitter": env_setting("IPMAN_MAX_REQUESTS_JITTER", max(1, max_requests // 10), int),
+        "preload_app": env_setting("IPMAN_PRELOAD", True, bool),
+        "timeout": env_setting("IPMAN_WORKER_TIMEOUT", 30, int),
+        "graceful_timeout": env_setting("IPMAN_GRACEFUL_TIMEOUT", 30, int),
+        "keepalive": env_setting("IPMAN_KEEPALIVE", 5, int),
+        "accesslog": env_setting("IPMAN_ACCESS_LOG"),
+        "post_fork": post_fork,
+    }
+    return options
+
+
+# Requests one worker process serves at once, as exported by run(); None when
+# the app was not started through this launcher (e.g. the Flask dev server)
+def worker_slots():
+    worker_class = env_setting("IPMAN_WORKER_CLASS")
+    if worker_class == "sync":
+        return 1
+    if worker_class == "gthread":
+        return env_setting("IPMAN_THREADS", 4, int)
+    if worker_class == "gevent":
+        return env_setting("IPMAN_WORKER_CONNECTIONS", 100, int)
+    return None
+
+
+# Slots of a worker that subscription streams may hold: at most half, so
+# queries and health checks always find a free one (none on sync workers)
+def stream_slots(slots):
+    return None if slots is None else slots // 2
+
+
+# Runs in each worker right after the fork
+def post_fork(server, worker):
+    # Never reuse connections opened by the master before the fork (a preloaded
+    # module may have touched the database); the master keeps its own sockets
+    db = sys.modules.get("database.db")
+    if db is not None and db.engine is not None:
+        db.engine.dispose(close=False)
+    # psycopg2 blocks the whole gevent worker unless its wait callback is patched
+    if worker.cfg.worker_class_str == "gevent":
+        try:
+            from psycogreen.gevent import patch_psycopg
+
+            patch_psycopg()
+        except ImportError:
+            logger.warning("psycogreen is not installed, database calls will block gevent workers.")
+
+
+def _application_class():
+    from gunicorn.app.base import BaseApplication
+    from gunicorn.util import import_app
+
+    class IPManApplication(BaseApplication):
+        def __init__(self, target, options):
+            self.target = target
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                if value is not None and key in self.cfg.settings:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            return import_app(self.target)
+
+    return IPManApplication
+
+
+def run(app_name, **overrides):
+    options = server_options(app_name, **overrides)
+    # Tell the app how much concurrency a worker really has (see worker_slots)
+    os.environ["IPMAN_WORKER_CLASS"] = options["worker_class"]
+    os.environ["IPMAN_THREADS"] = str(options["threads"])
+    os.environ["IPMAN_WORKER_CONNECTIONS"] = str(options["worker_connections"])
+    logger.info(
+        f"Starting {app_name} on {options['bind']}: {options['workers']} {options['worker_class']} worker(s), "
+        f"{options['threads']} thread(s) each, max_requests={options['max_requests']}"
+        f"+{options['max_requests_jitter']}, preload={options['preload_app']}."
+    )
+    _application_class()(APPS[app_name]["target"], options).run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the IPMan API or web app under Gunicorn.")
+    parser.add_argument("app", choices=sorted(APPS))
+    parser.add_argument("--worker-class", choices=WORKER_CLASSES)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--threads", type=int)
+    parser.add_argument("--bind")
+    args = parser.parse_args(argv)
+    run(args.app, worker_class=args.worker_class, workers=args.workers, threads=args.threads, bind=args.bind)
+
+
+if __name__ == "__main__":
+    main()
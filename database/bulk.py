@@ -0,0 +1,105 @@
+# Set-based bulk writes on ipman.ip_addresses
+# File: /database/bulk.py
+#
+# Every function runs a constant number of statements regardless of how many
+# rows are affected, inside the caller's transaction (the caller commits).
+
+import comm.app_logging as logging
+from sqlalchemy import insert, update, select, and_, null, case
+from sqlalchemy.sql import func
+from database.models import IPAddress
+from database.filters import IPFilter
+from database.summary import refresh_service_summary
+
+logger = logging.getLogger(__name__)
+
+ip_table = IPAddress.__table__
+
+# Rows per multi-VALUES INSERT statement
+INSERT_CHUNK_SIZE = 1000
+
+
+class SelectorError(ValueError):
+    pass
+
+
+def selector_clause(ids=None, cidr=None, service_id=None):
+    """SQL condition for a selector: explicit ids, a CIDR and/or a service (ANDed)."""
+    clauses = []
+    if ids is not None:
+        if not ids:
+            raise SelectorError("Selector 'ids' must not be empty.")
+        clauses.append(ip_table.c.id.in_(sorted({int(i) for i in ids})))
+    if cidr or service_id is not None:
+        clauses += IPFilter(within_cidr=cidr, service_id=service_id).clauses()
+    if not clauses:
+        raise SelectorError("Selector must specify ids, cidr or serviceId.")
+    return and_(*clauses)
+
+
+def _affected_services(session, clause):
+    rows = session.execute(select(ip_table.c.service_id).where(clause).distinct())
+    return [row[0] for row in rows if row[0] is not None]
+
+
+def bulk_create(session, rows):
+    """Insert IP rows with multi-VALUES INSERTs and return their new ids."""
+    ids = []
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        chunk = rows[start : start + INSERT_CHUNK_SIZE]
+        result = session.execute(insert(ip_table).values(chunk).returning(ip_table.c.id))
+        ids.extend(row[0] for row in result)
+    refresh_service_summary(session, [row.get("service_id") for row in rows])
+    logger.info(f"Bulk created {len(ids)} IP records.")
+    return ids
+
+
+# deactivated_at for a status change: rows already in the target status keep
+# their timestamp, others get now() (inactive) or NULL (active)
+def _deactivated_at(status):
+    if status not in ("active", "inactive"):
+        # Other statuses keep deactivated_at as is
+        return ip_table.c.deactivated_at
+    changed = func.now() if status == "inactive" else null()
+    return case((ip_table.c.status == status, ip_table.c.deactivated_at), else_=changed)
+
+
+def bulk_update(session, clause, values):
+    """Apply the same column values to every selected row in one UPDATE.
+
+    A status in values is applied in the same statement (with deactivated_at
+    as in bulk_set_status), so a selector on service_id still matches every
+    row when the service is changed at the same time.
+    """
+    services = _affected_services(session, clause)
+    values = dict(values, updated_at=func.now())
+    if "status" in values:
+        values["deactivated_at"] = _deactivated_at(values["status"])
+    result = session.execute(update(ip_table).where(clause).values(**values))
+    refresh_service_summary(session, services + [values.get("service_id")])
+    logger.info(f"Bulk updated {result.rowcount} IP records.")
+    return result.rowcount
+
+
+def bulk_set_status(session, clause, status):
+    """Activate/deactivate the selected rows (same semantics as IPAddress.activate/deactivate).
+
+    Rows already in the target status are left untouched, so their
+    deactivated_at timestamp is preserved.
+    """
+    clause = and_(clause, ip_table.c.status != status)
+    services = _affected_services(session, clause)
+    result = session.execute(
+        update(ip_table)
+        .where(clause)
+        .values(status=status, deactivated_at=_deactivated_at(status), updated_at=func.now())
+    )
+    refresh_service_summary(session, services)
+    logger.info(f"Set status '{status}' on {result.rowcount} IP records.")
+    return result.rowcount
+
+
+def bulk_reassign(session, clause, service_id):
+    """Move the selected rows to another service in one UPDATE."""
+    clause = and_(clause, ip_table.c.service_id.is_distinct_from(service_id))
+    return bulk_update(session, clause, {"service_id": service_id})
@@ -1,9 +1,13 @@
 # Database connection and session management
 # File: /database/db.py
+import threading
 import comm.app_logging as logging
+from contextlib import contextmanager
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from comm.config import Config  # Ensure this is properly fetching from Consul
+from comm.config import Config, env_setting  # Ensure this is properly fetching from Consul
+from database.replicas import ReplicaRouter
+from database import profiler
 from comm.app_logging import getLogger
 
 # Set up logger for database interactions
@@ -21,18 +25,54 @@ def get_database_url():
         raise
 
 
+# Time every statement on every engine (slow query log, per-request profiles)
+profiler.install()
+
+# Engine and session factory are created on first use, so processes that never
+# touch the database (e.g. snapshot serving) do not need Consul or Postgres
+engine = None
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+replica_router = None
+_init_lock = threading.Lock()
+
+
 # Create engine and session
-try:
-    engine = create_engine(get_database_url())
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    logger.info("Database engine and session created successfully.")
-except Exception as e:
-    logger.error(f"Failed to create the database engine or session: {e}")
-    raise
+def init_engine():
+    global engine, replica_router
+    if engine is not None:
+        return engine
+    with _init_lock:
+        if engine is not None:
+            return engine
+        try:
+            new_engine = create_engine(get_database_url())
+            SessionLocal.configure(bind=new_engine)
+            logger.info("Database engine and session created successfully.")
+        except Exception as e:
+            logger.error(f"Failed to create the database engine or session: {e}")
+            raise
+
+        # Replica routing for read-only traffic (falls back to the primary when none is usable)
+        try:
+            replica_router = ReplicaRouter(
+                SessionLocal,
+                Config().get_replica_urls(),
+                max_lag=env_setting("IPMAN_REPLICA_MAX_LAG", 10.0, float),
+                check_interval=env_setting("IPMAN_REPLICA_CHECK_INTERVAL", 5.0, float),
+                connect_timeout=env_setting("IPMAN_REPLICA_CONNECT_TIMEOUT", 2, int),
+                receiver_timeout=env_setting("IPMAN_REPLICA_RECEIVER_TIMEOUT", 60.0, float),
+            )
+            logger.info(f"Configured {len(replica_router.replicas)} read replica(s).")
+        except Exception as e:
+            logger.error(f"Failed to configure read replicas, using the primary only: {e}")
+            replica_router = ReplicaRouter(SessionLocal, [])
+        engine = new_engine
+    return engine
 
 
 # Dependency to get the database session
 def get_db_session():
+    init_engine()
     db = SessionLocal()
     try:
         yield db
@@ -43,3 +83,38 @@ def get_db_session():
     finally:
         db.close()
         logger.debug("Database session closed.")
+
+
+# Context manager around get_db_session that always closes the session
+@contextmanager
+def session_scope():
+    sessions = get_db_session()
+    try:
+        yield next(sessions)
+    finally:
+        sessions.close()
+
+
+# Dependency to get a read-only session (routed to a healthy replica when available)
+def get_read_session():
+    init_engine()
+    db = replica_router.pick()()
+    try:
+        yield db
+        logger.debug("Read session created and used.")
+    except Exception as e:
+        logger.error(f"An error occurred with the read session: {e}")
+        raise
+    finally:
+        db.close()
+        logger.debug("Read session closed.")
+
+
+# Context manager around get_read_session that always closes the session
+@contextmanager
+def read_session_scope():
+    sessions = get_read_session()
+    try:
+        yield next(sessions)
+    finally:
+        sessions.close()
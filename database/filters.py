@@ -0,0 +1,213 @@
+# Filter builder shared by the GraphQL resolvers and the web list routes
+# File: /database/filters.py
+
+import datetime
+import ipaddress
+from sqlalchemy import func, or_, and_
+from database.models import IPAddress, Service
+
+
+class FilterError(ValueError):
+    pass
+
+
+def _parse_time(name, value):
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime.datetime):
+        parsed = value  # Already parsed by the GraphQL DateTime scalar
+    else:
+        try:
+            parsed = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            raise FilterError(f"'{value}' is not a valid ISO 8601 timestamp for {name}.")
+    # Columns are naive timestamps; compare aware inputs in UTC
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _parse_int(name, value):
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise FilterError(f"'{value}' is not a valid value for {name}.")
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _time_window(column, after, before):
+    clauses = []
+    if after is not None:
+        clauses.append(column >= after)
+    if before is not None:
+        clauses.append(column < before)
+    return clauses
+
+
+def _in_window(value, after, before):
+    if after is None and before is None:
+        return True
+    if value is None:
+        return False
+    return (after is None or value >= after) and (before is None or value < before)
+
+
+class IPFilter:
+    """Validated filters for IP address listings.
+
+    clauses() compiles them into SQL conditions that can use the indexes in
+    database/sql/002_list_filter_indexes.sql; matches() applies the same
+    filters to an IP dictionary (as built by ip_to_dict) for snapshot serving.
+    """
+
+    def __init__(
+        self,
+        status=None,
+        service_id=None,
+        service_name=None,
+        ip_version=None,
+        within_cidr=None,
+        created_after=None,
+        created_before=None,
+        updated_after=None,
+        updated_before=None,
+    ):
+        self.status = status or None
+        self.service_id = _parse_int("serviceId", service_id)
+        self.service_name = service_name or None
+        self.ip_version = _parse_int("ipVersion", ip_version)
+        if self.ip_version not in (None, 4, 6):
+            raise FilterError("ipVersion must be 4 or 6.")
+        try:
+            self.within_cidr = ipaddress.ip_network(within_cidr, strict=False) if within_cidr else None
+        except ValueError:
+            raise FilterError(f"'{within_cidr}' is not a valid CIDR format.")
+        self.created_after = _parse_time("createdAfter", created_after)
+        self.created_before = _parse_time("createdBefore", created_before)
+        self.updated_after = _parse_time("updatedAfter", updated_after)
+        self.updated_before = _parse_time("updatedBefore", updated_before)
+
+    # Build from a web query string (all values are strings)
+    @classmethod
+    def from_args(cls, args):
+        return cls(
+            status=args.get("status"),
+            service_id=args.get("service_id"),
+            service_name=args.get("service_name"),
+            ip_version=args.get("ip_version"),
+            within_cidr=args.get("within_cidr"),
+            created_after=args.get("created_after"),
+            created_before=args.get("created_before"),
+            updated_after=args.get("updated_after"),
+            updated_before=args.get("updated_before"),
+        )
+
+    def clauses(self):
+        clauses = []
+        if self.status:
+            clauses.append(IPAddress.status == self.status)
+        if self.service_id is not None:
+            clauses.append(IPAddress.service_id == self.service_id)
+        if self.service_name:
+            clauses.append(IPAddress.service.has(Service.name == self.service_name))
+        if self.ip_version:
+            clauses.append(
+                func.family(
+                    func.coalesce(IPAddress.ip_address, IPAddress.ip_range, IPAddress.range_start)
+                )
+                == self.ip_version
+            )
+        if self.within_cidr is not None:
+            cidr = str(self.within_cidr)
+            clauses.append(
+                or_(
+                    IPAddress.ip_address.op("<<=")(cidr),
+                    IPAddress.ip_range.op("<<=")(cidr),
+                    and_(
+                        IPAddress.range_start.op("<<=")(cidr),
+                        IPAddress.range_end.op("<<=")(cidr),
+                    ),
+                )
+            )
+        clauses += _time_window(IPAddress.created_at, self.created_after, self.created_before)
+        clauses += _time_window(IPAddress.updated_at, self.updated_after, self.updated_before)
+        return clauses
+
+    def apply(self, query):
+        clauses = self.clauses()
+        return query.filter(*clauses) if clauses else query
+
+    def _within(self, ip):
+        network = self.within_cidr
+        if ip["ipAddress"] and ipaddress.ip_address(ip["ipAddress"]) in network:
+            return True
+        if ip["ipRange"]:
+            candidate = ipaddress.ip_network(ip["ipRange"])
+            if candidate.version == network.version and candidate.subnet_of(network):
+                return True
+        if ip["rangeStart"] and ip["rangeEnd"]:
+            return (
+                ipaddress.ip_address(ip["rangeStart"]) in network
+                and ipaddress.ip_address(ip["rangeEnd"]) in network
+            )
+        return False
+
+    def matches(self, ip):
+        service = ip.get("service")
+        if self.status and ip["status"] != self.status:
+            return False
+        if self.service_id is not None and (not service or int(service["id"]) != self.service_id):
+            return False
+        if self.service_name and (not service or service["name"] != self.service_name):
+            return False
+        if self.ip_version:
+            address = ip["ipAddress"] or ip["ipRange"] or ip["rangeStart"]
+            if not address or ipaddress.ip_interface(address).version != self.ip_version:
+                return False
+        if self.within_cidr is not None and not self._within(ip):
+            return False
+        return _in_window(ip["createdAt"], self.created_after, self.created_before) and _in_window(
+            ip["updatedAt"], self.updated_after, self.updated_before
+        )
+
+
+class ServiceFilter:
+    """Validated filters for service listings (see IPFilter)."""
+
+    def __init__(self, name_prefix=None, created_after=None, created_before=None):
+        self.name_prefix = name_prefix or None
+        self.created_after = _parse_time("createdAfter", created_after)
+        self.created_before = _parse_time("createdBefore", created_before)
+
+    # Build from a web query string ("q" is the name prefix search box)
+    @classmethod
+    def from_args(cls, args):
+        return cls(
+            name_prefix=args.get("q"),
+            created_after=args.get("created_after"),
+            created_before=args.get("created_before"),
+        )
+
+    def clauses(self):
+        clauses = []
+        if self.name_prefix:
+            # Matches the lower(name) text_pattern_ops index
+            clauses.append(
+                func.lower(Service.name).like(f"{_escape_like(self.name_prefix.lower())}%", escape="\\")
+            )
+        clauses += _time_window(Service.created_at, self.created_after, self.created_before)
+        return clauses
+
+    def apply(self, query):
+        clauses = self.clauses()
+        return query.filter(*clauses) if clauses else query
+
+    def matches(self, service):
+        if self.name_prefix and not (service["name"] or "").lower().startswith(self.name_prefix.lower()):
+            return False
+        return _in_window(service["createdAt"], self.created_after, self.created_before)
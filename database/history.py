@@ -0,0 +1,61 @@
+# Point-in-time lookups on ipman.ip_address_history
+# File: /database/history.py
+
+from sqlalchemy import cast, or_
+from sqlalchemy.dialects.postgresql import INET
+from sqlalchemy.types import TIMESTAMP
+from database.models import IPAddressHistory
+from database.filters import _parse_time
+
+
+def parse_as_of(value):
+    """Parse an asOf argument: a datetime or an ISO 8601 string (raises FilterError)."""
+    return _parse_time("asOf", value)
+
+
+def find_version_at(session, address, as_of):
+    """The version of the IP record covering address at as_of, or None.
+
+    Uses the GiST index on (addresses, valid). Like the live lookup, only
+    single addresses and start/end ranges match; CIDR records are left to
+    ipByCIDR. A single-address record wins over a range.
+    """
+    return (
+        session.query(IPAddressHistory)
+        .filter(
+            IPAddressHistory.addresses.op("@>")(cast(str(address), INET)),
+            IPAddressHistory.valid.op("@>")(cast(as_of, TIMESTAMP)),
+            or_(IPAddressHistory.ip_address.isnot(None), IPAddressHistory.ip_range.is_(None)),
+        )
+        .order_by(
+            IPAddressHistory.ip_address.is_(None),
+            IPAddressHistory.history_id.desc(),
+        )
+        .first()
+    )
+
+
+# Same shape as api.resolvers.ip_to_dict; updatedAt is when this version became current
+def version_to_dict(version):
+    return {
+        "id": version.ip_address_id,
+        "ipAddress": str(version.ip_address) if version.ip_address else None,
+        "ipRange": str(version.ip_range) if version.ip_range else None,
+        "rangeStart": str(version.range_start) if version.range_start else None,
+        "rangeEnd": str(version.range_end) if version.range_end else None,
+        "status": version.status,
+        "createdAt": version.created_at,
+        "updatedAt": version.valid.lower if version.valid is not None else None,
+        "deactivatedAt": version.deactivated_at,
+        "service": (
+            {
+                "id": version.service_id,
+                "name": version.service_name,
+                "description": None,
+                "createdAt": None,
+                "ipAddresses": [],
+            }
+            if version.service_id is not None
+            else None
+        ),
+    }
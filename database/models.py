@@ -1,16 +1,25 @@
 # File: /src/database/models.py
 
-from sqlalchemy import Column, Integer, String, TIMESTAMP, ForeignKey, CheckConstraint
+from sqlalchemy import Column, Integer, BigInteger, String, TIMESTAMP, ForeignKey, CheckConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.dialects.postgresql import INET, CIDR
+from sqlalchemy.dialects.postgresql import INET, CIDR, TSRANGE
+from sqlalchemy.types import UserDefinedType
 
 Base = declarative_base()
 
 # Specify schema for the existing tables
 schema = "ipman"
 
+
+# Range of addresses (custom PostgreSQL range type ipman.inetrange)
+class INETRANGE(UserDefinedType):
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        return f"{schema}.inetrange"
+
 # Service model
 class Service(Base):
     __tablename__ = "services"
@@ -63,3 +72,43 @@ class IPAddress(Base):
     def activate(self):
         self.status = "active"
         self.deactivated_at = None  # Clear the deactivation timestamp
+
+
+# Precomputed per-service counters for the web dashboard (maintained by database/summary.py)
+class ServiceSummary(Base):
+    __tablename__ = "service_summary"
+    __table_args__ = {"schema": schema}
+
+    service_id = Column(
+        Integer,
+        ForeignKey(f"{schema}.services.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    ip_count = Column(Integer, nullable=False, default=0)
+    active_count = Column(Integer, nullable=False, default=0)
+    inactive_count = Column(Integer, nullable=False, default=0)
+    last_changed_at = Column(TIMESTAMP, nullable=True)  # Latest change to the service or its IPs
+    refreshed_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+
+    service = relationship("Service")
+
+
+# Versions of IP records with their validity period (maintained by triggers,
+# see database/sql/003_ip_address_history.sql); rows are never updated by the app
+class IPAddressHistory(Base):
+    __tablename__ = "ip_address_history"
+    __table_args__ = {"schema": schema}
+
+    history_id = Column(BigInteger, primary_key=True)
+    ip_address_id = Column(Integer, nullable=False)  # No foreign key: history outlives deleted records
+    ip_address = Column(INET, nullable=True)
+    ip_range = Column(CIDR, nullable=True)
+    range_start = Column(INET, nullable=True)
+    range_end = Column(INET, nullable=True)
+    service_id = Column(Integer, nullable=True)
+    service_name = Column(String(255), nullable=True)  # Service name when the version was written
+    status = Column(String(50), nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False)
+    deactivated_at = Column(TIMESTAMP, nullable=True)
+    addresses = Column(INETRANGE, nullable=False)  # Addresses covered by this version
+    valid = Column(TSRANGE, nullable=False)  # [from, to) period this version was current
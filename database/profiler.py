@@ -0,0 +1,176 @@
+# Per-request SQL profiler: statement log, N+1 detection and slow query plans
+# File: /database/profiler.py
+#
+# Listeners on every SQLAlchemy Engine (primary and replicas, whenever they are
+# created) time each statement. Inside a profile() block the statements are
+# grouped by shape, i.e. the SQL text with parameter placeholders, so a resolver
+# that runs the same query once per parent shows up as one shape with a high
+# count. Statements slower than the threshold are logged everywhere, and their
+# plan is captured with a plain EXPLAIN (the statement is not run again).
+
+import re
+import time
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import comm.app_logging as logging
+from comm.config import env_setting
+
+logger = logging.getLogger(__name__)
+
+ENABLED = env_setting("IPMAN_PROFILER", True, bool)
+SLOW_QUERY_MS = env_setting("IPMAN_SLOW_QUERY_MS", 200.0, float)
+REPEAT_THRESHOLD = env_setting("IPMAN_N_PLUS_ONE_THRESHOLD", 5, int)
+EXPLAIN_SLOW = env_setting("IPMAN_PROFILER_EXPLAIN", True, bool)
+# A shape is explained at most once per process; this bounds the remembered shapes
+EXPLAIN_CACHE_SIZE = 256
+
+_current = contextvars.ContextVar("ipman_query_profile", default=None)
+_explained = OrderedDict()
+_installed = False
+
+# Expanded IN lists ("%(id_1_1)s, %(id_1_2)s, ...") vary in length per call
+_IN_LIST = re.compile(r"\(\s*%\(\w+?_\d+\)s(?:\s*,\s*%\(\w+?_\d+\)s)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def statement_shape(statement):
+    return _IN_LIST.sub("(...)", _SPACES.sub(" ", statement).strip())
+
+
+class QueryProfile:
+    """Statements executed during one GraphQL operation."""
+
+    def __init__(self, label=None):
+        self.label = label
+        self.count = 0
+        self.total_ms = 0.0
+        self.shapes = OrderedDict()  # shape -> [count, total_ms]
+        self.slow = []
+
+    def record(self, shape, duration_ms, plan=None):
+        self.count += 1
+        self.total_ms += duration_ms
+        entry = self.shapes.setdefault(shape, [0, 0.0])
+        entry[0] += 1
+        entry[1] += duration_ms
+        if duration_ms >= SLOW_QUERY_MS:
+            self.slow.append({"statement": shape, "durationMs": round(duration_ms, 2), "plan": plan})
+
+    def repeated(self):
+        return [
+            {"statement": shape, "count": count, "totalMs": round(total, 2)}
+            for shape, (count, total) in self.shapes.items()
+            if count >= REPEAT_THRESHOLD
+        ]
+
+    def summary(self):
+        return {
+            "statements": self.count,
+            "totalMs": round(self.total_ms, 2),
+            "repeated": self.repeated(),
+            "slow": self.slow,
+        }
+
+
+@contextmanager
+def profile(label=None):
+    """Group the statements run inside the block; yields the QueryProfile."""
+    current = QueryProfile(label)
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+        repeated = current.repeated()
+        for item in repeated:
+            logger.warning(
+                f"Possible N+1 in {label or 'request'}: statement ran {item['count']} times: {item['statement']}"
+            )
+        if repeated or current.slow:
+            logger.info(
+                f"Query profile for {label or 'request'}: {current.count} statements, {current.total_ms:.1f} ms."
+            )
+
+
+# Plan of a slow statement, taken on the same connection inside a savepoint so a
+# failing EXPLAIN cannot abort the caller's transaction
+def _explain(cursor, statement, parameters, shape):
+    if not EXPLAIN_SLOW or shape in _explained:
+        return None
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    _explained[shape] = True
+    if len(_explained) > EXPLAIN_CACHE_SIZE:
+        _explained.popitem(last=False)
+    explain_cursor = cursor.connection.cursor()
+    try:
+        explain_cursor.execute("SAVEPOINT ipman_explain")
+        try:
+            explain_cursor.execute(f"EXPLAIN {statement}", parameters)
+            plan = "\n".join(str(row[0]) for row in explain_cursor.fetchall())
+            explain_cursor.execute("RELEASE SAVEPOINT ipman_explain")
+            return plan
+        except Exception as e:
+            explain_cursor.execute("ROLLBACK TO SAVEPOINT ipman_explain")
+            logger.debug(f"EXPLAIN failed: {e}")
+            return None
+    except Exception as e:
+        logger.debug(f"Could not explain slow statement: {e}")
+        return None
+    finally:
+        explain_cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("ipman_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("ipman_query_start")
+    if not starts:
+        return
+    duration_ms = (time.perf_counter() - starts.pop()) * 1000
+    current = _current.get()
+    slow = duration_ms >= SLOW_QUERY_MS
+    if current is None and not slow:
+        return
+    shape = statement_shape(statement)
+    plan = None
+    if slow:
+        logger.warning(f"Slow query ({duration_ms:.1f} ms): {shape}")
+        if not executemany:
+            plan = _explain(cursor, statement, parameters, shape)
+    if current is not None:
+        current.record(shape, duration_ms, plan)
+
+
+def _handle_error(exception_context):
+    # The statement failed, so after_cursor_execute will not pop its start time
+    starts = exception_context.connection.info.get("ipman_query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+# Register the listeners on all engines (idempotent)
+def install():
+    global _installed
+    if _installed or not ENABLED:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+    _installed = True
+
+
+# Remove the hooks again (tests)
+def uninstall():
+    global _installed
+    if not _installed:
+        return
+    event.remove(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.remove(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.remove(Engine, "handle_error", _handle_error)
+    _installed = False
@@ -0,0 +1,139 @@
+# Read-replica routing with lag checks and fallback to the primary
+# File: /database/replicas.py
+
+import os
+import time
+import threading
+import comm.app_logging as logging
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import text
+
+logger = logging.getLogger(__name__)
+
+# Replication lag in seconds; 0 on a primary. A replica that has replayed all
+# the WAL it received is only 0 seconds behind while its WAL receiver is
+# streaming and has heard from the primary recently: a disconnected receiver
+# freezes both positions. Otherwise the replay position is compared with the
+# primary's current one (when known), and any gap is measured by the age of
+# the last replayed commit. NULL when the lag cannot be told.
+LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() AND EXISTS ("
+    "SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming' "
+    "AND last_msg_receipt_time > now() - make_interval(secs => :receiver_timeout)) THEN 0 "
+    "WHEN pg_wal_lsn_diff(CAST(:primary_lsn AS pg_lsn), pg_last_wal_replay_lsn()) <= 0 THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+PRIMARY_LSN_QUERY = text("SELECT CAST(pg_current_wal_lsn() AS text)")
+
+
+class Replica:
+    def __init__(self, url, connect_timeout=2, engine_options=None):
+        self.engine = create_engine(
+            url, pool_pre_ping=True, connect_args={"connect_timeout": connect_timeout}, **(engine_options or {})
+        )
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.name = self.engine.url.host or self.engine.url.render_as_string(hide_password=True)
+        self.healthy = False
+        self.lag = None
+        self.checked_at = 0.0
+        self.state = None
+
+    # Refresh health and lag; problems are logged when the state changes, not on every check
+    def check(self, max_lag, primary_lsn=None, receiver_timeout=60.0):
+        try:
+            with self.engine.connect() as connection:
+                lag = connection.execute(
+                    LAG_QUERY, {"primary_lsn": primary_lsn, "receiver_timeout": receiver_timeout}
+                ).scalar()
+            self.lag = None if lag is None else float(lag)
+            self.healthy = self.lag is not None and self.lag <= max_lag
+            state = "up" if self.healthy else "lagging"
+            if state != self.state and not self.healthy:
+                behind = "by an unknown time" if self.lag is None else f"by {self.lag:.1f}s"
+                logger.warning(f"Replica {self.name} lagging {behind}, skipping it.")
+        except Exception as e:
+            self.healthy = False
+            self.lag = None
+            state = "down"
+            if state != self.state:
+                logger.warning(f"Replica {self.name} unreachable: {e}")
+        if state == "up" and self.state not in (None, "up"):
+            logger.info(f"Replica {self.name} is usable again.")
+        self.state = state
+        self.checked_at = time.monotonic()
+        return self.healthy
+
+
+class ReplicaRouter:
+    """Round-robins read sessions across healthy replicas.
+
+    A background thread per process re-checks replica health (reachability
+    and replication lag) every check_interval seconds, so picking a session
+    never waits on a replica. Until the first check, and whenever no replica
+    is usable, the primary session factory is returned instead. A replica's
+    WAL receiver counts as disconnected when it has not heard from the
+    primary for receiver_timeout seconds (PostgreSQL's wal_receiver_timeout).
+    """
+
+    def __init__(
+        self, primary_factory, urls, max_lag=10.0, check_interval=5.0, connect_timeout=2, receiver_timeout=60.0
+    ):
+        self.primary_factory = primary_factory
+        self.replicas = [Replica(url, connect_timeout) for url in urls]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.receiver_timeout = receiver_timeout
+        self._next = 0
+        self._lock = threading.Lock()
+        self._pid = None
+
+    # Start the checker thread once per process (threads do not survive Gunicorn's preload fork)
+    def ensure_started(self):
+        if not self.replicas or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            thread = threading.Thread(target=self._run, name="ipman-replica-check", daemon=True)
+            thread.start()
+
+    # The primary's current WAL position, or None when it cannot be read
+    def primary_lsn(self):
+        try:
+            with self.primary_factory() as session:
+                return session.execute(PRIMARY_LSN_QUERY).scalar()
+        except Exception as e:
+            logger.debug(f"Could not read the primary's WAL position: {e}")
+            return None
+
+    def check(self):
+        primary_lsn = self.primary_lsn()
+        for replica in self.replicas:
+            replica.check(self.max_lag, primary_lsn, self.receiver_timeout)
+
+    def _run(self):
+        while True:
+            self.check()
+            time.sleep(self.check_interval)
+
+    def pick(self):
+        self.ensure_started()
+        count = len(self.replicas)
+        for _ in range(count):
+            with self._lock:
+                replica = self.replicas[self._next % count]
+                self._next += 1
+            if replica.healthy:
+                return replica.SessionLocal
+        if count:
+            logger.debug("No healthy read replica available, falling back to primary.")
+        return self.primary_factory
+
+    def status(self):
+        return [
+            {"replica": replica.name, "healthy": replica.healthy, "lag": replica.lag}
+            for replica in self.replicas
+        ]
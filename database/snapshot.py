@@ -0,0 +1,543 @@
+# Versioned binary snapshot of ipman.services / ipman.ip_addresses
+# File: /database/snapshot.py
+#
+# Layout (little endian, all sections at fixed offsets given by the header):
+#
+#   header    HEADER
+#   services  SERVICE * n_services, sorted by id
+#   records   RECORD * n_records, grouped by service (no-service records last)
+#   ranges    RANGE * n_ranges: addresses and start/end ranges, by level, then start
+#   levels    uint32 * (len(LEVEL_SPANS) + 1), first range of each level
+#   prefix    uint32 * (PREFIX_BUCKETS + 1), first level 0 range per IPv4 /16
+#   cidrs     RANGE * n_cidrs: ip_range networks, sorted by start address
+#   strings   UTF-8 string pool referenced by (offset, length) pairs
+#
+# Addresses are stored as 128-bit integers (IPv4 mapped into ::ffff:0:0/96),
+# split into two uint64 halves. Ranges are split into levels by size, so
+# single addresses and small ranges are never stored behind a wide range that
+# covers them. Within a level, each entry carries the running maximum of range
+# ends. A point lookup walks backwards from the last range starting at or
+# before the address. It stops as soon as that maximum falls below the address,
+# which is at the first entry for a miss. A hit only passes entries of the same
+# level that start inside the matching range. CIDRs are only used by
+# ipByCIDR and live in their own section, so they never lengthen an address
+# lookup. Readers mmap the file and unpack entries in place, so all processes
+# serving the same file share one copy in the page cache.
+
+import os
+import sys
+import mmap
+import time
+import struct
+import bisect
+import datetime
+import ipaddress
+import threading
+import comm.app_logging as logging
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"IPMANSNP"
+VERSION = 2
+
+HEADER = struct.Struct("<8sHHqIIII8Q")
+SERVICE = struct.Struct("<iIIqIIII")
+RECORD = struct.Struct("<iiqqq10I")
+RANGE = struct.Struct("<QQQQQQIB3x")
+PREFIX_ENTRY = struct.Struct("<I")
+PREFIX_BUCKETS = 1 << 16
+
+# Largest number of addresses a range of each level may cover; lookups try the
+# narrowest level first, so the most specific record wins
+LEVEL_SPANS = (1 << 8, 1 << 16, 1 << 32, 1 << 128)
+
+# Range kinds, mirroring how ipByAddress / ipByCIDR match rows in the database
+KIND_ADDRESS = 0  # ip_address
+KIND_RANGE = 1  # range_start .. range_end
+KIND_CIDR = 2  # ip_range
+KIND_IPV6 = 0x10  # flag: entry belongs to the IPv6 family
+
+NULL_REF = 0xFFFFFFFF
+NULL_TIME = -(1 << 63)
+EPOCH = datetime.datetime(1970, 1, 1)
+V4_BASE = 0xFFFF << 32
+MASK64 = (1 << 64) - 1
+
+
+class SnapshotError(Exception):
+    pass
+
+
+# Map an address to the 128-bit integer space used by the snapshot
+def address_to_int(address):
+    if address.version == 4:
+        return V4_BASE | int(address)
+    return int(address)
+
+
+def _to_micros(value):
+    if value is None:
+        return NULL_TIME
+    return (value - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def _from_micros(value):
+    if value == NULL_TIME:
+        return None
+    return EPOCH + datetime.timedelta(microseconds=value)
+
+
+class _StringPool:
+    def __init__(self):
+        self.data = bytearray()
+        self.index = {}
+
+    def add(self, value):
+        if value is None:
+            return NULL_REF, 0
+        value = str(value)
+        if value not in self.index:
+            encoded = value.encode("utf-8")
+            self.index[value] = (len(self.data), len(encoded))
+            self.data += encoded
+        return self.index[value]
+
+
+# Level of a (start, end, ...) range entry: the narrowest one that fits it
+def _level(entry):
+    span = entry[1] - entry[0] + 1
+    return next(level for level, limit in enumerate(LEVEL_SPANS) if span <= limit)
+
+
+# Pack range entries, with the running maximum of ends restarting at each level
+def _pack_ranges(entries, levels):
+    blob = bytearray()
+    max_end = 0
+    previous_level = None
+    for (start, end, record_idx, kind, version), level in zip(entries, levels):
+        if level != previous_level:
+            max_end = 0
+            previous_level = level
+        max_end = max(max_end, end)
+        blob += RANGE.pack(
+            start >> 64,
+            start & MASK64,
+            end >> 64,
+            end & MASK64,
+            max_end >> 64,
+            max_end & MASK64,
+            record_idx,
+            kind | (KIND_IPV6 if version == 6 else 0),
+        )
+    return blob
+
+
+def write_snapshot(path, services, records, generated_at=None):
+    """Write a snapshot file atomically.
+
+    services: iterable of dicts with id, name, description, created_at.
+    records: iterable of dicts with id, service_id, ip_address, ip_range,
+    range_start, range_end, status, created_at, updated_at, deactivated_at.
+    """
+    services = sorted(services, key=lambda service: service["id"])
+    service_index = {service["id"]: i for i, service in enumerate(services)}
+
+    # Group records by service so service(id) { ipAddresses } is a contiguous slice
+    def record_order(record):
+        idx = service_index.get(record["service_id"])
+        return (idx if idx is not None else len(services), record["id"])
+
+    records = sorted(records, key=record_order)
+    pool = _StringPool()
+    first_record = {}
+    counts = {}
+    record_blob = bytearray()
+    ranges = []
+    cidrs = []
+
+    for i, record in enumerate(records):
+        idx = service_index.get(record["service_id"], -1)
+        if idx >= 0:
+            first_record.setdefault(idx, i)
+            counts[idx] = counts.get(idx, 0) + 1
+
+        ip_address = str(ipaddress.ip_interface(record["ip_address"]).ip) if record["ip_address"] else None
+        ip_range = str(ipaddress.ip_network(record["ip_range"], strict=False)) if record["ip_range"] else None
+        range_start = str(ipaddress.ip_interface(record["range_start"]).ip) if record["range_start"] else None
+        range_end = str(ipaddress.ip_interface(record["range_end"]).ip) if record["range_end"] else None
+
+        if ip_address:
+            address = ipaddress.ip_address(ip_address)
+            ranges.append((address_to_int(address), address_to_int(address), i, KIND_ADDRESS, address.version))
+        if range_start and range_end:
+            start, end = ipaddress.ip_address(range_start), ipaddress.ip_address(range_end)
+            if start.version == end.version:
+                ranges.append((address_to_int(start), address_to_int(end), i, KIND_RANGE, start.version))
+        if ip_range:
+            network = ipaddress.ip_network(ip_range)
+            cidrs.append(
+                (
+                    address_to_int(network.network_address),
+                    address_to_int(network.broadcast_address),
+                    i,
+                    KIND_CIDR,
+                    network.version,
+                )
+            )
+
+        refs = []
+        for value in (ip_address, ip_range, range_start, range_end, record["status"]):
+            refs.extend(pool.add(value))
+        record_blob += RECORD.pack(
+            record["id"],
+            idx,
+            _to_micros(record["created_at"]),
+            _to_micros(record["updated_at"]),
+            _to_micros(record["deactivated_at"]),
+            *refs,
+        )
+
+    service_blob = bytearray()
+    for idx, service in enumerate(services):
+        service_blob += SERVICE.pack(
+            service["id"],
+            first_record.get(idx, 0),
+            counts.get(idx, 0),
+            _to_micros(service["created_at"]),
+            *pool.add(service["name"]),
+            *pool.add(service["description"]),
+        )
+
+    ranges.sort(key=lambda entry: (_level(entry), entry[0], entry[1]))
+    levels = [_level(entry) for entry in ranges]
+    range_blob = _pack_ranges(ranges, levels)
+    level_blob = bytearray()
+    for level in range(len(LEVEL_SPANS) + 1):
+        level_blob += PREFIX_ENTRY.pack(bisect.bisect_left(levels, level))
+
+    # Bucket bounds cover level 0 only: the wider levels are small
+    starts = [entry[0] for entry in ranges[: levels.count(0)]]
+    prefix_blob = bytearray()
+    for bucket in range(PREFIX_BUCKETS + 1):
+        prefix_blob += PREFIX_ENTRY.pack(bisect.bisect_left(starts, V4_BASE + (bucket << 16)))
+
+    cidrs.sort(key=lambda entry: (entry[0], entry[1]))
+    cidr_blob = _pack_ranges(cidrs, [0] * len(cidrs))
+
+    services_off = HEADER.size
+    records_off = services_off + len(service_blob)
+    ranges_off = records_off + len(record_blob)
+    levels_off = ranges_off + len(range_blob)
+    prefix_off = levels_off + len(level_blob)
+    cidrs_off = prefix_off + len(prefix_blob)
+    strings_off = cidrs_off + len(cidr_blob)
+    generated_at = generated_at if generated_at is not None else int(time.time() * 1_000_000)
+
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        0,
+        generated_at,
+        len(services),
+        len(records),
+        len(ranges),
+        len(cidrs),
+        services_off,
+        records_off,
+        ranges_off,
+        levels_off,
+        prefix_off,
+        cidrs_off,
+        strings_off,
+        len(pool.data),
+    )
+
+    # Write next to the target and rename, so readers never see a partial file
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        for blob in (header, service_blob, record_blob, range_blob, level_blob, prefix_blob, cidr_blob, pool.data):
+            f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    logger.info(
+        f"Snapshot written to {path}: {len(services)} services, {len(records)} IP records, "
+        f"{len(ranges)} ranges, {len(cidrs)} CIDRs."
+    )
+    return generated_at
+
+
+# Build a snapshot from the database (primary or replica session)
+def build_snapshot(session, path):
+    from database.models import IPAddress, Service
+
+    services = [
+        {"id": row.id, "name": row.name, "description": row.description, "created_at": row.created_at}
+        for row in session.query(Service.id, Service.name, Service.description, Service.created_at)
+    ]
+    records = [
+        {
+            "id": row.id,
+            "service_id": row.service_id,
+            "ip_address": row.ip_address,
+            "ip_range": row.ip_range,
+            "range_start": row.range_start,
+            "range_end": row.range_end,
+            "status": row.status,
+            "created_at": row.created_at,
+            "updated_at": row.updated_at,
+            "deactivated_at": row.deactivated_at,
+        }
+        for row in session.query(
+            IPAddress.id,
+            IPAddress.service_id,
+            IPAddress.ip_address,
+            IPAddress.ip_range,
+            IPAddress.range_start,
+            IPAddress.range_end,
+            IPAddress.status,
+            IPAddress.created_at,
+            IPAddress.updated_at,
+            IPAddress.deactivated_at,
+        ).yield_per(10000)
+    ]
+    return write_snapshot(path, services, records)
+
+
+class SnapshotReader:
+    """Read-only, memory-mapped view over a snapshot file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._buf) < HEADER.size:
+            raise SnapshotError(f"Snapshot {path} is truncated.")
+        (
+            magic,
+            version,
+            _,
+            self.generated_at,
+            self.n_services,
+            self.n_records,
+            self.n_ranges,
+            self.n_cidrs,
+            self._services_off,
+            self._records_off,
+            self._ranges_off,
+            self._levels_off,
+            self._prefix_off,
+            self._cidrs_off,
+            self._strings_off,
+            strings_len,
+        ) = HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path} is not an ipman snapshot.")
+        if version != VERSION:
+            raise SnapshotError(f"Unsupported snapshot version {version} in {path}.")
+        if self._strings_off + strings_len != len(self._buf):
+            raise SnapshotError(f"Snapshot {path} is truncated.")
+
+    # -- low level accessors -------------------------------------------------
+
+    def _string(self, offset, length):
+        if offset == NULL_REF:
+            return None
+        return str(self._buf[self._strings_off + offset : self._strings_off + offset + length], "utf-8")
+
+    def _range(self, i, section_off=None):
+        s_hi, s_lo, e_hi, e_lo, m_hi, m_lo, record_idx, kind = RANGE.unpack_from(
+            self._buf, (self._ranges_off if section_off is None else section_off) + i * RANGE.size
+        )
+        return (s_hi << 64) | s_lo, (e_hi << 64) | e_lo, (m_hi << 64) | m_lo, record_idx, kind
+
+    def _range_start(self, i, section_off):
+        s_hi, s_lo = struct.unpack_from("<QQ", self._buf, section_off + i * RANGE.size)
+        return (s_hi << 64) | s_lo
+
+    def _prefix(self, bucket):
+        return PREFIX_ENTRY.unpack_from(self._buf, self._prefix_off + bucket * PREFIX_ENTRY.size)[0]
+
+    def _level_start(self, level):
+        return PREFIX_ENTRY.unpack_from(self._buf, self._levels_off + level * PREFIX_ENTRY.size)[0]
+
+    # Index of the first range whose start is greater than value, within [lo, hi)
+    def _bisect_right(self, value, lo, hi, section_off):
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if value < self._range_start(mid, section_off):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def _bisect_left(self, value, lo, hi, section_off):
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._range_start(mid, section_off) < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    # -- lookups -------------------------------------------------------------
+
+    def find_address(self, address):
+        """Index of a record whose ip_address or start/end range holds address."""
+        value = address_to_int(address)
+        family = KIND_IPV6 if address.version == 6 else 0
+        for level in range(len(LEVEL_SPANS)):
+            first, last = self._level_start(level), self._level_start(level + 1)
+            if level == 0 and address.version == 4:
+                bucket = int(address) >> 16
+                idx = self._bisect_right(value, self._prefix(bucket), self._prefix(bucket + 1), self._ranges_off)
+            else:
+                idx = self._bisect_right(value, first, last, self._ranges_off)
+            for i in range(idx - 1, first - 1, -1):
+                start, end, max_end, record_idx, kind = self._range(i)
+                if max_end < value:
+                    break
+                if end >= value and kind & KIND_IPV6 == family:
+                    return record_idx
+        return None
+
+    def find_within(self, network):
+        """Indexes of CIDR records contained in network (ip_range <<= network)."""
+        low = address_to_int(network.network_address)
+        high = address_to_int(network.broadcast_address)
+        family = KIND_IPV6 if network.version == 6 else 0
+        found = []
+        for i in range(self._bisect_left(low, 0, self.n_cidrs, self._cidrs_off), self.n_cidrs):
+            start, end, _, record_idx, kind = self._range(i, self._cidrs_off)
+            if start > high:
+                break
+            if end <= high and kind == KIND_CIDR | family:
+                found.append(record_idx)
+        return found
+
+    def find_service(self, service_id):
+        lo, hi = 0, self.n_services
+        while lo < hi:
+            mid = (lo + hi) // 2
+            current = struct.unpack_from("<i", self._buf, self._services_off + mid * SERVICE.size)[0]
+            if current < service_id:
+                lo = mid + 1
+            elif current > service_id:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    # -- materialisation (same shape as api.resolvers.ip_to_dict / service_to_dict)
+
+    def service(self, idx, include_ips=False):
+        service_id, first, count, created_at, name_off, name_len, desc_off, desc_len = SERVICE.unpack_from(
+            self._buf, self._services_off + idx * SERVICE.size
+        )
+        return {
+            "id": service_id,
+            "name": self._string(name_off, name_len),
+            "description": self._string(desc_off, desc_len),
+            "createdAt": _from_micros(created_at),
+            "ipAddresses": (
+                [self.record(i, include_service=False) for i in range(first, first + count)]
+                if include_ips
+                else []
+            ),
+        }
+
+    def record(self, idx, include_service=True):
+        fields = RECORD.unpack_from(self._buf, self._records_off + idx * RECORD.size)
+        record_id, service_idx, created_at, updated_at, deactivated_at = fields[:5]
+        refs = fields[5:]
+        ip_address, ip_range, range_start, range_end, status = (
+            self._string(refs[i], refs[i + 1]) for i in range(0, 10, 2)
+        )
+        return {
+            "id": record_id,
+            "ipAddress": ip_address,
+            "ipRange": ip_range,
+            "rangeStart": range_start,
+            "rangeEnd": range_end,
+            "status": status,
+            "createdAt": _from_micros(created_at),
+            "updatedAt": _from_micros(updated_at),
+            "deactivatedAt": _from_micros(deactivated_at),
+            "service": (
+                self.service(service_idx, include_ips=False)
+                if service_idx >= 0 and include_service
+                else None
+            ),
+        }
+
+    def services(self):
+        return [self.service(i) for i in range(self.n_services)]
+
+    def records(self):
+        return [self.record(i) for i in range(self.n_records)]
+
+
+class SnapshotStore:
+    """Holds the current SnapshotReader and swaps it when the file is replaced.
+
+    The file is stat'ed at most every reload_interval seconds. A new reader is
+    only published once it has been opened and validated, so requests always
+    see either the old or the new snapshot, never a mix.
+    """
+
+    def __init__(self, path, reload_interval=1.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._reader = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._reload()
+
+    def _reload(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            if self._reader is None:
+                logger.warning(f"Snapshot {self.path} not found.")
+            return
+        signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if signature == self._signature:
+            return
+        try:
+            reader = SnapshotReader(self.path)
+        except (OSError, ValueError, struct.error, SnapshotError) as e:
+            logger.error(f"Failed to load snapshot {self.path}: {e}")
+            return
+        self._reader = reader
+        self._signature = signature
+        logger.info(
+            f"Loaded snapshot {self.path} generated at {_from_micros(reader.generated_at)} "
+            f"({reader.n_records} IP records)."
+        )
+
+    def get(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.reload_interval:
+            with self._lock:
+                if now - self._checked_at >= self.reload_interval:
+                    self._checked_at = now
+                    self._reload()
+        return self._reader
+
+
+# Command line entry point: python -m database.snapshot <output path>
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("Usage: python -m database.snapshot <output path>", file=sys.stderr)
+        return 2
+    from database.db import read_session_scope
+
+    with read_session_scope() as session:
+        build_snapshot(session, argv[0])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,24 @@
+-- Precomputed per-service counters for the web dashboard
+-- File: /database/sql/001_service_summary.sql
+--
+-- Rows are kept up to date incrementally by database/summary.py whenever the
+-- web app writes a service or IP. Run `python -m database.summary` once after
+-- creating the table (or at any time) to rebuild it from scratch.
+
+CREATE TABLE IF NOT EXISTS ipman.service_summary (
+    service_id      integer PRIMARY KEY REFERENCES ipman.services (id) ON DELETE CASCADE,
+    ip_count        integer NOT NULL DEFAULT 0,
+    active_count    integer NOT NULL DEFAULT 0,
+    inactive_count  integer NOT NULL DEFAULT 0,
+    last_changed_at timestamp,
+    refreshed_at    timestamp NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS service_summary_last_changed_idx
+    ON ipman.service_summary (last_changed_at DESC);
+
+-- Support keyset pagination of /ips (default order: updated_at DESC NULLS LAST, id DESC)
+-- and per-service lookups on the IP list
+CREATE INDEX IF NOT EXISTS ip_addresses_service_id_idx ON ipman.ip_addresses (service_id);
+CREATE INDEX IF NOT EXISTS ip_addresses_updated_at_idx ON ipman.ip_addresses (updated_at DESC NULLS LAST, id DESC);
+CREATE INDEX IF NOT EXISTS ip_addresses_status_idx ON ipman.ip_addresses (status);
@@ -0,0 +1,19 @@
+-- Indexes backing the list filters in database/filters.py
+-- File: /database/sql/002_list_filter_indexes.sql
+
+-- withinCidr: containment (<<=) on the address columns
+CREATE INDEX IF NOT EXISTS ip_addresses_ip_address_gist ON ipman.ip_addresses USING gist (ip_address inet_ops);
+CREATE INDEX IF NOT EXISTS ip_addresses_ip_range_gist ON ipman.ip_addresses USING gist (ip_range inet_ops);
+CREATE INDEX IF NOT EXISTS ip_addresses_range_start_gist ON ipman.ip_addresses USING gist (range_start inet_ops);
+
+-- ipVersion
+CREATE INDEX IF NOT EXISTS ip_addresses_family_idx
+    ON ipman.ip_addresses (family(COALESCE(ip_address, ip_range, range_start)));
+
+-- createdAfter / createdBefore (updated_at is indexed in 001_service_summary.sql)
+CREATE INDEX IF NOT EXISTS ip_addresses_created_at_idx ON ipman.ip_addresses (created_at);
+CREATE INDEX IF NOT EXISTS services_created_at_idx ON ipman.services (created_at);
+
+-- serviceName and namePrefix
+CREATE INDEX IF NOT EXISTS services_name_idx ON ipman.services (name);
+CREATE INDEX IF NOT EXISTS services_lower_name_pattern_idx ON ipman.services (lower(name) text_pattern_ops);
@@ -0,0 +1,177 @@
+-- Append-only history of IP records, for point-in-time ("as of") lookups
+-- File: /database/sql/003_ip_address_history.sql
+--
+-- Each row is one version of an ipman.ip_addresses row together with the
+-- period it was current (valid, [from, to); open-ended for the current
+-- version) and the span of addresses it covers (addresses). Statement-level
+-- triggers with transition tables maintain the table, so a bulk UPDATE of
+-- 10,000 rows costs one set-based statement rather than 10,000 trigger calls.
+-- Versions are only written when an address, the service or the status
+-- changes. The GiST index on (addresses, valid) answers "which record covered
+-- this address at that time" without scanning years of history.
+--
+-- Requires PostgreSQL 10 or later (transition tables). Timestamps use the
+-- same naive now()::timestamp convention as ipman.ip_addresses, and a
+-- transaction's changes share its start time.
+
+-- Range of addresses; inet's btree ordering keeps IPv4 below IPv6
+DO $$
+BEGIN
+    CREATE TYPE ipman.inetrange AS RANGE (subtype = inet);
+EXCEPTION
+    WHEN duplicate_object THEN NULL;
+END
+$$;
+
+-- Addresses covered by an IP record (single address, CIDR or start/end range)
+CREATE OR REPLACE FUNCTION ipman.ip_address_span(ip_address inet, ip_range cidr, range_start inet, range_end inet)
+RETURNS ipman.inetrange
+LANGUAGE sql IMMUTABLE
+AS $$
+    SELECT CASE
+        WHEN ip_address IS NOT NULL THEN
+            ipman.inetrange(host(ip_address)::inet, host(ip_address)::inet, '[]')
+        WHEN ip_range IS NOT NULL THEN
+            ipman.inetrange(host(network(ip_range))::inet, host(broadcast(ip_range))::inet, '[]')
+        ELSE
+            -- Tolerate rows stored with start and end swapped instead of aborting the write
+            ipman.inetrange(
+                least(host(range_start)::inet, host(range_end)::inet),
+                greatest(host(range_start)::inet, host(range_end)::inet),
+                '[]'
+            )
+    END
+$$;
+
+CREATE TABLE IF NOT EXISTS ipman.ip_address_history (
+    history_id      bigserial PRIMARY KEY,
+    ip_address_id   integer NOT NULL,  -- No foreign key: history outlives deleted records
+    ip_address      inet,
+    ip_range        cidr,
+    range_start     inet,
+    range_end       inet,
+    service_id      integer,
+    service_name    varchar(255),      -- Name of the service when the version was written
+    status          varchar(50) NOT NULL,
+    created_at      timestamp NOT NULL,
+    deactivated_at  timestamp,
+    addresses       ipman.inetrange NOT NULL,
+    valid           tsrange NOT NULL
+);
+
+-- Point-in-time lookups: addresses @> ip AND valid @> ts
+CREATE INDEX IF NOT EXISTS ip_address_history_lookup_idx
+    ON ipman.ip_address_history USING gist (addresses, valid);
+
+-- Closing the current version of a record
+CREATE INDEX IF NOT EXISTS ip_address_history_current_idx
+    ON ipman.ip_address_history (ip_address_id)
+    WHERE upper_inf(valid);
+
+CREATE INDEX IF NOT EXISTS ip_address_history_record_idx
+    ON ipman.ip_address_history (ip_address_id, history_id);
+
+
+-- Open a new version for each row of the transition table
+CREATE OR REPLACE FUNCTION ipman.ip_address_history_insert()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO ipman.ip_address_history (
+        ip_address_id, ip_address, ip_range, range_start, range_end, service_id, service_name,
+        status, created_at, deactivated_at, addresses, valid
+    )
+    SELECT n.id, n.ip_address, n.ip_range, n.range_start, n.range_end, n.service_id, s.name,
+           n.status, n.created_at, n.deactivated_at,
+           ipman.ip_address_span(n.ip_address, n.ip_range, n.range_start, n.range_end),
+           tsrange(now()::timestamp, NULL)
+    FROM new_rows n
+    LEFT JOIN ipman.services s ON s.id = n.service_id;
+    RETURN NULL;
+END
+$$;
+
+-- Close the current version of the changed rows and open a new one (one statement;
+-- rows whose tracked columns did not change, e.g. only updated_at, are skipped)
+CREATE OR REPLACE FUNCTION ipman.ip_address_history_update()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    WITH changed AS (
+        SELECT n.*
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        WHERE (n.ip_address, n.ip_range, n.range_start, n.range_end, n.service_id, n.status, n.deactivated_at)
+              IS DISTINCT FROM
+              (o.ip_address, o.ip_range, o.range_start, o.range_end, o.service_id, o.status, o.deactivated_at)
+    ),
+    closed AS (
+        UPDATE ipman.ip_address_history h
+        SET valid = tsrange(lower(h.valid), greatest(lower(h.valid), now()::timestamp))
+        FROM changed c
+        WHERE h.ip_address_id = c.id AND upper_inf(h.valid)
+    )
+    INSERT INTO ipman.ip_address_history (
+        ip_address_id, ip_address, ip_range, range_start, range_end, service_id, service_name,
+        status, created_at, deactivated_at, addresses, valid
+    )
+    SELECT c.id, c.ip_address, c.ip_range, c.range_start, c.range_end, c.service_id, s.name,
+           c.status, c.created_at, c.deactivated_at,
+           ipman.ip_address_span(c.ip_address, c.ip_range, c.range_start, c.range_end),
+           tsrange(now()::timestamp, NULL)
+    FROM changed c
+    LEFT JOIN ipman.services s ON s.id = c.service_id;
+    RETURN NULL;
+END
+$$;
+
+-- Close the current version of deleted rows
+CREATE OR REPLACE FUNCTION ipman.ip_address_history_delete()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE ipman.ip_address_history h
+    SET valid = tsrange(lower(h.valid), greatest(lower(h.valid), now()::timestamp))
+    FROM old_rows o
+    WHERE h.ip_address_id = o.id AND upper_inf(h.valid);
+    RETURN NULL;
+END
+$$;
+
+-- Transition tables require one trigger per event
+DROP TRIGGER IF EXISTS ip_address_history_insert ON ipman.ip_addresses;
+CREATE TRIGGER ip_address_history_insert
+    AFTER INSERT ON ipman.ip_addresses
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE ipman.ip_address_history_insert();
+
+DROP TRIGGER IF EXISTS ip_address_history_update ON ipman.ip_addresses;
+CREATE TRIGGER ip_address_history_update
+    AFTER UPDATE ON ipman.ip_addresses
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE ipman.ip_address_history_update();
+
+DROP TRIGGER IF EXISTS ip_address_history_delete ON ipman.ip_addresses;
+CREATE TRIGGER ip_address_history_delete
+    AFTER DELETE ON ipman.ip_addresses
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE ipman.ip_address_history_delete();
+
+-- Seed the current state of records that have no history yet. Earlier changes
+-- were never recorded, so the first version starts at the last update.
+INSERT INTO ipman.ip_address_history (
+    ip_address_id, ip_address, ip_range, range_start, range_end, service_id, service_name,
+    status, created_at, deactivated_at, addresses, valid
+)
+SELECT i.id, i.ip_address, i.ip_range, i.range_start, i.range_end, i.service_id, s.name,
+       i.status, i.created_at, i.deactivated_at,
+       ipman.ip_address_span(i.ip_address, i.ip_range, i.range_start, i.range_end),
+       tsrange(i.updated_at, NULL)
+FROM ipman.ip_addresses i
+LEFT JOIN ipman.services s ON s.id = i.service_id
+WHERE NOT EXISTS (
+    SELECT 1 FROM ipman.ip_address_history h WHERE h.ip_address_id = i.id
+);
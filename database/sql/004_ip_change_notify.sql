@@ -0,0 +1,85 @@
+-- Push notifications for IP status and service assignment changes
+-- File: /database/sql/004_ip_change_notify.sql
+--
+-- Statement-level triggers send one NOTIFY on channel ipman_ip_changes per
+-- write statement that changes a status or service (and per insert), listing
+-- the ids of the changed rows with their previous status and service. Large
+-- statements are split into chunks of 100 rows, which keeps each payload well
+-- under the 8000 byte NOTIFY limit. Each API process LISTENs on one connection,
+-- loads the current rows of a notification with one query, and fans the
+-- changes out to its GraphQL subscribers (api/subscriptions.py). A bulk
+-- mutation therefore costs each subscriber one queue entry per 100 rows rather
+-- than one per row. Notifications are delivered when the transaction commits,
+-- and never for rolled back changes.
+--
+-- Payload: {"changedAt": ..., "changes": [[id, previous status,
+-- previous service id, status changed, service changed], ...]}
+--
+-- Requires PostgreSQL 10 or later (transition tables). NOTIFY goes to
+-- listeners on the primary only; it is not replicated.
+
+CREATE OR REPLACE FUNCTION ipman.ip_change_notify_insert()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify(
+        'ipman_ip_changes',
+        json_build_object(
+            'changedAt', now()::timestamp,
+            'changes', json_agg(json_build_array(c.id, NULL, NULL, true, c.service_id IS NOT NULL))
+        )::text
+    )
+    FROM (
+        SELECT n.id, n.service_id, (row_number() OVER (ORDER BY n.id) - 1) / 100 AS chunk
+        FROM new_rows n
+    ) c
+    GROUP BY c.chunk;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION ipman.ip_change_notify_update()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM pg_notify(
+        'ipman_ip_changes',
+        json_build_object(
+            'changedAt', now()::timestamp,
+            'changes', json_agg(
+                json_build_array(c.id, c.old_status, c.old_service_id, c.status_changed, c.service_changed)
+            )
+        )::text
+    )
+    FROM (
+        SELECT
+            n.id,
+            o.status AS old_status,
+            o.service_id AS old_service_id,
+            n.status IS DISTINCT FROM o.status AS status_changed,
+            n.service_id IS DISTINCT FROM o.service_id AS service_changed,
+            (row_number() OVER (ORDER BY n.id) - 1) / 100 AS chunk
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        WHERE n.status IS DISTINCT FROM o.status
+           OR n.service_id IS DISTINCT FROM o.service_id
+    ) c
+    GROUP BY c.chunk;
+    RETURN NULL;
+END
+$$;
+
+-- Transition tables require one trigger per event
+DROP TRIGGER IF EXISTS ip_change_notify_insert ON ipman.ip_addresses;
+CREATE TRIGGER ip_change_notify_insert
+    AFTER INSERT ON ipman.ip_addresses
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE ipman.ip_change_notify_insert();
+
+DROP TRIGGER IF EXISTS ip_change_notify_update ON ipman.ip_addresses;
+CREATE TRIGGER ip_change_notify_update
+    AFTER UPDATE ON ipman.ip_addresses
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE PROCEDURE ipman.ip_change_notify_update();
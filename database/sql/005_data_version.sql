@@ -0,0 +1,40 @@
+-- Change counter for ipman.services / ipman.ip_addresses
+-- File: /database/sql/005_data_version.sql
+--
+-- Every write statement on either table increments ipman.data_version.version
+-- in the same transaction. The new value becomes visible when the transaction
+-- commits, in commit order, on the primary and on replicas. The shared lookup
+-- cache (api/shared_cache.py) polls this single row to know when to rebuild.
+-- Timestamps cannot serve that purpose: a transaction that started earlier
+-- may commit after a later one and carry an older updated_at.
+--
+-- The counter row is locked until the writing transaction ends, so concurrent
+-- writes to these tables are serialized at commit. IPMan's write volume is
+-- low; keep it in mind before running long transactions against these tables.
+
+CREATE TABLE IF NOT EXISTS ipman.data_version (
+    singleton boolean PRIMARY KEY DEFAULT true CHECK (singleton),
+    version   bigint NOT NULL DEFAULT 0
+);
+
+INSERT INTO ipman.data_version (singleton) VALUES (true) ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION ipman.bump_data_version()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE ipman.data_version SET version = version + 1;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS bump_data_version ON ipman.ip_addresses;
+CREATE TRIGGER bump_data_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON ipman.ip_addresses
+    FOR EACH STATEMENT EXECUTE PROCEDURE ipman.bump_data_version();
+
+DROP TRIGGER IF EXISTS bump_data_version ON ipman.services;
+CREATE TRIGGER bump_data_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON ipman.services
+    FOR EACH STATEMENT EXECUTE PROCEDURE ipman.bump_data_version();
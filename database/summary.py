@@ -0,0 +1,80 @@
+# Maintenance of the precomputed ipman.service_summary table
+# File: /database/summary.py
+
+import sys
+import comm.app_logging as logging
+from sqlalchemy.sql import text
+
+logger = logging.getLogger(__name__)
+
+# Recompute the counters of the selected services in one set-based upsert
+_REFRESH_SQL = """
+INSERT INTO ipman.service_summary
+    (service_id, ip_count, active_count, inactive_count, last_changed_at, refreshed_at)
+SELECT
+    s.id,
+    count(ip.id),
+    count(ip.id) FILTER (WHERE ip.status = 'active'),
+    count(ip.id) FILTER (WHERE ip.status <> 'active'),
+    GREATEST(s.created_at, max(ip.updated_at), max(ip.deactivated_at)),
+    now()
+FROM ipman.services s
+LEFT JOIN ipman.ip_addresses ip ON ip.service_id = s.id
+{where}
+GROUP BY s.id
+ON CONFLICT (service_id) DO UPDATE SET
+    ip_count = EXCLUDED.ip_count,
+    active_count = EXCLUDED.active_count,
+    inactive_count = EXCLUDED.inactive_count,
+    last_changed_at = EXCLUDED.last_changed_at,
+    refreshed_at = EXCLUDED.refreshed_at
+"""
+
+# Refreshes of the same service are serialised until the end of the transaction:
+# under READ COMMITTED, two transactions changing IPs of one service would each
+# count without the other's change, and the last upsert would win. Waiting for
+# the lock lets the later count see the earlier commit. Ids are locked in order
+# to avoid deadlocks between transactions touching several services.
+SUMMARY_LOCK_CLASS = 4701  # First key of the two-key advisory locks taken here
+LOCK_SERVICES = text(
+    "SELECT pg_advisory_xact_lock(:lock_class, service_id) "
+    "FROM unnest(CAST(:service_ids AS integer[])) AS service_id ORDER BY service_id"
+)
+REFRESH_SERVICES = text(_REFRESH_SQL.format(where="WHERE s.id = ANY(:service_ids)"))
+REBUILD_ALL = text(_REFRESH_SQL.format(where=""))
+
+
+def refresh_service_summary(session, service_ids):
+    """Refresh the summary rows of the given services inside the caller's transaction.
+
+    Call it after the change has been flushed and before committing, so the
+    summary is committed (or rolled back) together with the change.
+    """
+    service_ids = sorted({int(service_id) for service_id in service_ids if service_id is not None})
+    if not service_ids:
+        return
+    try:
+        session.execute(LOCK_SERVICES, {"lock_class": SUMMARY_LOCK_CLASS, "service_ids": service_ids})
+        session.execute(REFRESH_SERVICES, {"service_ids": service_ids})
+    except Exception as e:
+        logger.error(f"Failed to refresh service summary for {service_ids}: {e}")
+        raise
+
+
+def rebuild_service_summary(session):
+    session.execute(REBUILD_ALL)
+    logger.info("Service summary rebuilt.")
+
+
+# Command line entry point: python -m database.summary (full rebuild)
+def main():
+    from database.db import session_scope
+
+    with session_scope() as session:
+        rebuild_service_summary(session)
+        session.commit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
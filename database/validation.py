@@ -0,0 +1,19 @@
+# Validation of IP records shared by the web forms and the GraphQL mutations
+# File: /database/validation.py
+
+from ipaddress import ip_address as parse_ip_address
+
+
+# Why a start/end range is unusable, or None when it is fine (or not given)
+def range_error(range_start, range_end):
+    if not range_start and not range_end:
+        return None
+    try:
+        start, end = parse_ip_address(range_start or ""), parse_ip_address(range_end or "")
+    except ValueError:
+        return "Invalid range. Please provide valid start and end IP addresses."
+    if start.version != end.version:
+        return "The range start and end must be of the same IP version."
+    if start > end:
+        return "The range start must not be greater than the range end."
+    return None
@@ -0,0 +1,135 @@
+# Unit tests for admission control (rate limits, load shedding, client keys)
+# File: /tests/test_admission.py
+
+import time
+import threading
+import pytest
+from flask import Flask
+from api import admission
+from api.admission import (
+    ConcurrencyLimiter,
+    RateLimiter,
+    TokenBucket,
+    admission_control,
+    client_key,
+    default_concurrency,
+    parse_networks,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+# A bucket allows its burst at once, then refills at the configured rate
+def test_token_bucket_burst_and_refill(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    bucket = TokenBucket(rate=2.0, burst=3.0)
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+    assert bucket.retry_after() == 0.5
+    clock.now += 0.5
+    assert bucket.take()
+    assert not bucket.take()
+    clock.now += 60
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+
+
+# Clients have separate buckets; the least recently seen one is evicted first
+def test_rate_limiter_per_client(monkeypatch):
+    monkeypatch.setattr(admission.time, "monotonic", FakeClock())
+    limiter = RateLimiter(rate=1.0, burst=1.0, max_clients=2)
+    assert limiter.allow("a") == (True, 0.0)
+    assert limiter.allow("a")[0] is False
+    assert limiter.allow("b")[0] is True
+    assert limiter.allow("c")[0] is True  # Evicts "a"
+    assert limiter.allow("a")[0] is True
+    assert RateLimiter(rate=0, burst=0, max_clients=1).allow("a") == (True, 0.0)
+
+
+# Requests beyond the concurrency limit wait briefly, then are shed
+def test_concurrency_limiter_sheds_when_full():
+    limiter = ConcurrencyLimiter(max_concurrent=1, max_waiting=1, target_delay=0.05)
+    assert limiter.acquire()
+    assert not limiter.acquire()  # Waited target_delay, still full
+    limiter.release()
+    assert limiter.acquire()
+    limiter.release()
+
+
+# A slot released while waiting is handed to the waiter
+def test_concurrency_limiter_waiter_gets_released_slot():
+    limiter = ConcurrencyLimiter(max_concurrent=1, max_waiting=1, target_delay=5.0)
+    assert limiter.acquire()
+    threading.Timer(0.05, limiter.release).start()
+    assert limiter.acquire()
+    limiter.release()
+
+
+def request_key(remote_addr, headers, proxies):
+    app = Flask(__name__)
+    with app.test_request_context("/graphql", headers=headers, environ_base={"REMOTE_ADDR": remote_addr}):
+        return client_key(parse_networks(proxies))
+
+
+# Client headers are only believed from a trusted proxy
+def test_client_key_trusts_headers_from_proxies_only():
+    headers = {"X-Client-Id": "team-a", "X-Forwarded-For": "198.51.100.7"}
+    assert request_key("203.0.113.9", headers, "") == "203.0.113.9"
+    assert request_key("203.0.113.9", headers, "10.0.0.0/8") == "203.0.113.9"
+    assert request_key("10.0.0.2", headers, "10.0.0.0/8") == "team-a"
+    # The nearest hop that is not a proxy; a forged leftmost hop is ignored
+    forwarded = {"X-Forwarded-For": "1.2.3.4, 198.51.100.7, 10.0.0.3"}
+    assert request_key("10.0.0.2", forwarded, "10.0.0.0/8") == "198.51.100.7"
+    assert request_key("10.0.0.2", {}, "10.0.0.0/8") == "10.0.0.2"
+
+
+@pytest.fixture
+def guarded(monkeypatch):
+    monkeypatch.setattr(admission.time, "monotonic", FakeClock())
+    monkeypatch.setattr(admission, "rate_limiter", RateLimiter(rate=1.0, burst=5.0, max_clients=10))
+    monkeypatch.setattr(admission, "concurrency_limiter", ConcurrencyLimiter(1, 0, 0.01))
+    app = Flask(__name__)
+
+    @app.route("/graphql", methods=["POST"])
+    @admission_control
+    def graphql():
+        return {"data": {}}
+
+    return app.test_client()
+
+
+# A batch is charged one token per operation; the rejection says when to retry
+def test_admission_charges_batches_per_operation(guarded):
+    assert guarded.post("/graphql", json=[{"query": "{ a }"}] * 4).status_code == 200
+    assert guarded.post("/graphql", json={"query": "{ a }"}).status_code == 200
+    response = guarded.post("/graphql", json={"query": "{ a }"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    # Other clients have their own bucket
+    assert guarded.post("/graphql", json={}, environ_base={"REMOTE_ADDR": "10.9.9.9"}).status_code == 200
+
+
+# A saturated worker, or a request that already queued upstream too long, gets 503
+def test_admission_sheds_load(guarded):
+    assert admission.concurrency_limiter.acquire()
+    response = guarded.post("/graphql", json={})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    admission.concurrency_limiter.release()
+    stale = {"X-Request-Start": f"t={int((time.time() - 5) * 1000)}"}
+    assert guarded.post("/graphql", json={}, headers=stale).status_code == 503
+    assert guarded.post("/graphql", json={}).status_code == 200
+
+
+# /graphql leaves room for the streams and one /health request
+def test_default_concurrency():
+    assert default_concurrency(None) == 8
+    assert default_concurrency(1) == 1
+    assert default_concurrency(4) == 1
+    assert default_concurrency(8) == 3
+    assert default_concurrency(100) == 49
@@ -0,0 +1,92 @@
+# Unit tests for batched POST /graphql requests (served from a snapshot, no database)
+# File: /tests/test_batch.py
+
+import datetime
+import pytest
+import api.app as app_module
+from database.snapshot import SnapshotReader, write_snapshot
+
+CREATED = datetime.datetime(2024, 5, 1, 12, 30)
+
+
+class FixedSnapshotStore:
+    def __init__(self, reader):
+        self.reader = reader
+
+    def get(self):
+        return self.reader
+
+
+def ip_row(id, ip_address, status="active"):
+    return {
+        "id": id,
+        "service_id": 1,
+        "ip_address": ip_address,
+        "ip_range": None,
+        "range_start": None,
+        "range_end": None,
+        "status": status,
+        "created_at": CREATED,
+        "updated_at": None,
+        "deactivated_at": None,
+    }
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    path = str(tmp_path / "ipman.snap")
+    write_snapshot(
+        path,
+        [{"id": 1, "name": "ChannelX", "description": None, "created_at": CREATED}],
+        [ip_row(1, "185.180.14.1"), ip_row(2, "185.180.14.2", "inactive")],
+    )
+    monkeypatch.setattr(app_module, "snapshot_store", FixedSnapshotStore(SnapshotReader(path)))
+    monkeypatch.setattr(app_module, "MAX_BATCH_SIZE", 3)
+    return app_module.api_app.test_client()
+
+
+def lookup(address):
+    return {"query": f'{{ ipByAddress(address: "{address}") {{ status }} }}'}
+
+
+# A batch answers with one result per operation, in request order
+def test_batch_results_in_order(client):
+    response = client.post("/graphql", json=[lookup("185.180.14.2"), lookup("10.0.0.1"), lookup("185.180.14.1")])
+    assert response.status_code == 200
+    assert response.get_json() == [
+        {"data": {"ipByAddress": {"status": "inactive"}}},
+        {"data": {"ipByAddress": None}},
+        {"data": {"ipByAddress": {"status": "active"}}},
+    ]
+
+
+# Errors stay with the operation that caused them
+def test_batch_errors_are_per_operation(client):
+    batch = [lookup("185.180.14.1"), {"query": "{ ipByAddress(address: \"185.180.14.1\") { nope } }"}, lookup("nope")]
+    results = client.post("/graphql", json=batch).get_json()
+    assert results[0] == {"data": {"ipByAddress": {"status": "active"}}}
+    assert "nope" in results[1]["errors"][0]["message"] and "data" not in results[1]
+    assert "is invalid" in results[2]["errors"][0]["message"]
+
+
+# Empty batches, non-object entries and oversized batches are refused as a whole
+@pytest.mark.parametrize(
+    "batch, message",
+    [
+        ([], "Empty batch."),
+        ([lookup("185.180.14.1"), "{ services { id } }"], "Each operation must be a JSON object."),
+        ([lookup("185.180.14.1"), None], "Each operation must be a JSON object."),
+        ([lookup("185.180.14.1")] * 4, "Batch size exceeds limit of 3."),
+    ],
+)
+def test_rejected_batches(client, batch, message):
+    response = client.post("/graphql", json=batch)
+    assert response.status_code == 400
+    assert response.get_json() == {"errors": [{"message": message}]}
+
+
+# A single operation still gets a single result
+def test_single_operation(client):
+    assert client.post("/graphql", json=lookup("185.180.14.1")).get_json() == {
+        "data": {"ipByAddress": {"status": "active"}}
+    }
@@ -0,0 +1,98 @@
+# Unit tests for the bulk mutations: input validation and the SQL they compile to
+# File: /tests/test_bulk.py
+
+import pytest
+from graphql import GraphQLError
+from sqlalchemy.dialects import postgresql
+from api.resolvers import validate_ip_and_range
+from database.bulk import SelectorError, bulk_set_status, bulk_update, selector_clause
+
+
+def compile_sql(statement):
+    compiled = statement.compile(dialect=postgresql.dialect())
+    return " ".join(str(compiled).split()), compiled.params
+
+
+# Records the statements instead of running them; no row matches _affected_services
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(statement)
+        return RecordingResult()
+
+
+class RecordingResult(list):
+    rowcount = 3
+
+
+# Every row is validated, CIDR rows included; mixed-version ranges are a GraphQL error
+@pytest.mark.parametrize(
+    "row, message",
+    [
+        ({}, "You must provide"),
+        ({"ip_address": "10.0.0.300"}, "is not a valid IP address"),
+        ({"range_start": "10.0.0.1", "range_end": "2001:db8::1"}, "same IP version"),
+        ({"range_start": "10.0.0.9", "range_end": "10.0.0.1"}, "must not be greater"),
+        ({"ip_range": "10.0.0.0/24", "range_start": "10.0.0.9", "range_end": "10.0.0.1"}, "must not be greater"),
+        ({"ip_range": "10.0.0.0/24", "range_start": "10.0.0.9"}, "Invalid range"),
+    ],
+)
+def test_invalid_rows(row, message):
+    with pytest.raises(GraphQLError, match=message):
+        validate_ip_and_range(row.get("ip_address"), row.get("range_start"), row.get("range_end"), row.get("ip_range"))
+
+
+# Each kind of record on its own is accepted
+@pytest.mark.parametrize(
+    "row",
+    [
+        {"ip_address": "2001:db8::1"},
+        {"ip_range": "10.0.0.0/24"},
+        {"range_start": "10.0.0.1", "range_end": "10.0.0.1"},
+    ],
+)
+def test_valid_rows(row):
+    validate_ip_and_range(row.get("ip_address"), row.get("range_start"), row.get("range_end"), row.get("ip_range"))
+
+
+# Selector parts are ANDed; ids are deduplicated and sorted
+def test_selector_clause():
+    sql, params = compile_sql(selector_clause(ids=["3", 1, 3], cidr="10.0.0.5/8", service_id=2))
+    assert "ipman.ip_addresses.id IN (__[POSTCOMPILE_id_1])" in sql
+    assert "ipman.ip_addresses.ip_range <<= %(ip_range_1)s" in sql
+    assert "ipman.ip_addresses.service_id = %(service_id_1)s" in sql
+    assert sql.count(" AND ") == 3  # Containment also checks the address family
+    assert (params["id_1"], params["ip_range_1"], params["service_id_1"]) == ([1, 3], "10.0.0.0/8", 2)
+
+
+# An empty or missing selector would touch every row, so it is refused
+@pytest.mark.parametrize("selector", [{}, {"ids": []}])
+def test_selector_clause_requires_a_selection(selector):
+    with pytest.raises(SelectorError):
+        selector_clause(**selector)
+
+
+# Deactivation skips inactive rows and keeps their timestamp in one UPDATE
+def test_deactivate_sql():
+    session = RecordingSession()
+    assert bulk_set_status(session, selector_clause(service_id=2), "inactive") == 3
+    affected, statement = session.statements
+    sql, params = compile_sql(statement)
+    assert sql.startswith("UPDATE ipman.ip_addresses SET status=%(status)s, updated_at=now(), deactivated_at=CASE")
+    assert "WHEN (ipman.ip_addresses.status = %(status_1)s) THEN ipman.ip_addresses.deactivated_at ELSE now() END" in sql
+    assert sql.endswith("AND ipman.ip_addresses.status != %(status_2)s")
+    assert (params["status"], params["status_1"], params["status_2"]) == ("inactive", "inactive", "inactive")
+    assert "DISTINCT ipman.ip_addresses.service_id" in compile_sql(affected)[0]
+
+
+# Activation clears deactivated_at; a status in a bulk update gets the same treatment
+def test_activate_in_bulk_update_sql():
+    session = RecordingSession()
+    bulk_update(session, selector_clause(ids=[1]), {"status": "active", "service_id": 4})
+    affected, statement, *summary = session.statements  # Then the summary lock and refresh of service 4
+    sql, params = compile_sql(statement)
+    assert "deactivated_at=CASE WHEN (ipman.ip_addresses.status = %(status_1)s) " in sql
+    assert "THEN ipman.ip_addresses.deactivated_at ELSE NULL END" in sql
+    assert (params["status"], params["service_id"]) == ("active", 4)
@@ -0,0 +1,85 @@
+# Unit tests for JSON encoding and response compression
+# File: /tests/test_encoding.py
+
+import gzip
+import json
+import datetime
+import ipaddress
+from api.encoding import ENCODERS, encode_json, compress_body
+
+
+# Every registered encoder should handle datetimes and IP objects
+def test_encoders_handle_datetimes_and_ips():
+    payload = {
+        "createdAt": datetime.datetime(2024, 5, 1, 12, 30),
+        "ipAddress": ipaddress.ip_address("185.180.14.1"),
+        "ipRange": ipaddress.ip_network("10.0.0.0/24"),
+    }
+    for name in ENCODERS:
+        assert json.loads(encode_json(payload, encoder=name)) == {
+            "createdAt": "2024-05-01T12:30:00",
+            "ipAddress": "185.180.14.1",
+            "ipRange": "10.0.0.0/24",
+        }
+
+
+# Small bodies are never compressed
+def test_compress_body_below_threshold():
+    body, encoding = compress_body(b"{}", "gzip", min_size=1024)
+    assert body == b"{}" and encoding is None
+
+
+# Large bodies are gzipped when the client accepts it
+def test_compress_body_gzip():
+    raw = b"x" * 4096
+    body, encoding = compress_body(raw, "gzip, deflate", min_size=1024)
+    assert encoding == "gzip"
+    assert gzip.decompress(body) == raw
+
+
+# Encodings with q=0 are refused
+def test_compress_body_refused_encoding():
+    body, encoding = compress_body(b"x" * 4096, "gzip;q=0", min_size=1024)
+    assert encoding is None
+
+
+# Timestamps reach /graphql responses as ISO 8601, whichever encoder is used
+def test_graphql_timestamps_are_iso(tmp_path):
+    from flask import Flask
+    from ariadne import graphql_sync
+    from api.encoding import json_response
+    from api.schema import snapshot_schema
+    from database.snapshot import SnapshotReader, write_snapshot
+
+    created = datetime.datetime(2024, 5, 1, 12, 30, 15, 250000)
+    path = str(tmp_path / "ipman.snap")
+    write_snapshot(
+        path,
+        [{"id": 1, "name": "ChannelX", "description": None, "created_at": created}],
+        [
+            {
+                "id": 7,
+                "service_id": 1,
+                "ip_address": "185.180.14.1",
+                "ip_range": None,
+                "range_start": None,
+                "range_end": None,
+                "status": "active",
+                "created_at": created,
+                "updated_at": None,
+                "deactivated_at": None,
+            }
+        ],
+    )
+    query = '{ ipByAddress(address: "185.180.14.1") { createdAt updatedAt service { createdAt } } }'
+    success, result = graphql_sync(
+        snapshot_schema, {"query": query}, context_value={"snapshot": SnapshotReader(path)}
+    )
+    assert success and "errors" not in result
+    with Flask(__name__).app_context():
+        body = json.loads(json_response(result).get_data())
+    assert body["data"]["ipByAddress"] == {
+        "createdAt": "2024-05-01T12:30:15.250000",
+        "updatedAt": None,
+        "service": {"createdAt": "2024-05-01T12:30:15.250000"},
+    }
@@ -0,0 +1,203 @@
+# Unit tests for the list filters: SQL clauses and in-memory matches() must agree
+# File: /tests/test_filters.py
+
+import datetime
+import ipaddress
+import operator
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql import elements, functions, operators
+from database.filters import FilterError, IPFilter, ServiceFilter
+
+T0 = datetime.datetime(2024, 1, 1, 10, 0)
+
+
+def row(id, ip_address=None, ip_range=None, range_start=None, range_end=None, status="active", hours=0):
+    created = T0 + datetime.timedelta(hours=hours)
+    return {
+        "id": id,
+        "ip_address": ip_address,
+        "ip_range": ip_range,
+        "range_start": range_start,
+        "range_end": range_end,
+        "status": status,
+        "service_id": 1,
+        "created_at": created,
+        "updated_at": created + datetime.timedelta(minutes=30),
+    }
+
+
+ROWS = [
+    row(1, ip_address="10.1.2.3"),
+    row(2, ip_address="192.168.0.1", status="inactive", hours=1),
+    row(3, ip_range="10.20.0.0/16", hours=2),
+    row(4, ip_range="10.0.0.0/7", hours=3),
+    row(5, range_start="10.0.0.1", range_end="10.0.0.9", status="inactive", hours=4),
+    row(6, range_start="10.255.255.0", range_end="11.0.0.5", hours=5),
+    row(7, ip_address="2001:db8::1", hours=6),
+    row(8, ip_range="2001:db8:1::/48", status="inactive", hours=7),
+]
+
+
+# Same record in the shape of api.resolvers.ip_to_dict
+def as_dict(record):
+    return {
+        "id": record["id"],
+        "ipAddress": record["ip_address"],
+        "ipRange": record["ip_range"],
+        "rangeStart": record["range_start"],
+        "rangeEnd": record["range_end"],
+        "status": record["status"],
+        "createdAt": record["created_at"],
+        "updatedAt": record["updated_at"],
+        "deactivatedAt": None,
+        "service": {"id": record["service_id"], "name": "ChannelX"},
+    }
+
+
+def _contained(value, network):
+    if value is None:
+        return None
+    value, network = ipaddress.ip_network(value, strict=False), ipaddress.ip_network(network)
+    return value.version == network.version and value.subnet_of(network)
+
+
+def _family(value):
+    return None if value is None else ipaddress.ip_interface(value).version
+
+
+COMPARISONS = {
+    operators.eq: operator.eq,
+    operators.ge: operator.ge,
+    operators.lt: operator.lt,
+}
+
+
+# Evaluate a compiled filter clause against a row with PostgreSQL's NULL semantics
+def evaluate(clause, record):
+    if isinstance(clause, elements.Grouping):
+        return evaluate(clause.element, record)
+    if isinstance(clause, elements.BindParameter):
+        return clause.value
+    if isinstance(clause, elements.ColumnClause):
+        return record[clause.key]
+    if isinstance(clause, elements.BooleanClauseList):
+        values = [evaluate(item, record) for item in clause.clauses]
+        decisive = True if clause.operator is operators.or_ else False
+        if decisive in values:
+            return decisive
+        return None if None in values else not decisive
+    if isinstance(clause, functions.Function):
+        args = [evaluate(item, record) for item in clause.clauses]
+        if clause.name == "coalesce":
+            return next((arg for arg in args if arg is not None), None)
+        if clause.name == "family":
+            return _family(args[0])
+    if isinstance(clause, elements.BinaryExpression):
+        left, right = evaluate(clause.left, record), evaluate(clause.right, record)
+        if getattr(clause.operator, "opstring", None) == "<<=":
+            return _contained(left, right)
+        if left is None or right is None:
+            return None
+        return COMPARISONS[clause.operator](left, right)
+    raise AssertionError(f"Unsupported clause {clause!r}")
+
+
+def sql_ids(ip_filter):
+    clauses = ip_filter.clauses()
+    return [record["id"] for record in ROWS if all(evaluate(clause, record) is True for clause in clauses)]
+
+
+def matched_ids(ip_filter):
+    return [record["id"] for record in ROWS if ip_filter.matches(as_dict(record))]
+
+
+@pytest.mark.parametrize(
+    "filters, expected",
+    [
+        ({"status": "inactive"}, [2, 5, 8]),
+        ({"ip_version": 4}, [1, 2, 3, 4, 5, 6]),
+        ({"ip_version": "6"}, [7, 8]),
+        ({"within_cidr": "10.0.0.0/8"}, [1, 3, 5]),
+        ({"within_cidr": "10.0.0.5/8"}, [1, 3, 5]),
+        ({"within_cidr": "10.0.0.0/7"}, [1, 3, 4, 5, 6]),
+        ({"within_cidr": "2001:db8::/32"}, [7, 8]),
+        ({"within_cidr": "10.0.0.0/8", "status": "active"}, [1, 3]),
+        ({"created_after": "2024-01-01T12:00:00"}, [3, 4, 5, 6, 7, 8]),
+        ({"created_before": "2024-01-01T12:00:00"}, [1, 2]),
+        # Aware inputs are compared in UTC against the naive columns
+        ({"created_after": "2024-01-01T14:00:00+02:00", "created_before": "2024-01-01T15:00:00Z"}, [3, 4, 5]),
+        ({"updated_after": "2024-01-01T10:30:00.000001-00:00"}, [2, 3, 4, 5, 6, 7, 8]),
+        ({"updated_before": "2024-01-01T06:30:00-05:00"}, [1]),
+    ],
+)
+def test_clauses_and_matches_agree(filters, expected):
+    ip_filter = IPFilter(**filters)
+    assert sql_ids(ip_filter) == expected
+    assert matched_ids(ip_filter) == expected
+
+
+# The filters compile for PostgreSQL, with the operators the 002 indexes serve
+def test_ip_clauses_compile_for_postgres():
+    ip_filter = IPFilter(
+        status="active", ip_version=6, within_cidr="10.0.0.5/8", created_after="2024-01-01T12:00Z"
+    )
+    compiled = [clause.compile(dialect=postgresql.dialect()) for clause in ip_filter.clauses()]
+    sql = " AND ".join(str(clause) for clause in compiled)
+    params = {key: value for clause in compiled for key, value in clause.params.items()}
+    assert "family(coalesce(ipman.ip_addresses.ip_address, ipman.ip_addresses.ip_range" in sql
+    assert "ipman.ip_addresses.ip_range <<= %(ip_range_1)s" in sql
+    assert params["ip_range_1"] == "10.0.0.0/8"
+    assert params["created_at_1"] == datetime.datetime(2024, 1, 1, 12, 0)
+    assert params["created_at_1"].tzinfo is None
+
+
+# Invalid inputs are reported as FilterError
+@pytest.mark.parametrize(
+    "filters",
+    [{"ip_version": 5}, {"ip_version": "four"}, {"within_cidr": "10.0.0.300/8"}, {"created_after": "yesterday"}],
+)
+def test_invalid_ip_filters(filters):
+    with pytest.raises(FilterError):
+        IPFilter(**filters)
+
+
+# Name prefixes escape LIKE wildcards and match case-insensitively in both forms
+def test_service_filter_name_prefix():
+    service_filter = ServiceFilter(name_prefix="Ch_", created_after="2024-01-01T11:00:00+01:00")
+    compiled = service_filter.clauses()[0].compile(dialect=postgresql.dialect())
+    assert "lower(ipman.services.name) LIKE" in str(compiled)
+    assert list(compiled.params.values()) == ["ch\\_%"]
+    assert service_filter.matches({"name": "CH_Sales", "createdAt": T0})
+    assert not service_filter.matches({"name": "ChannelX", "createdAt": T0})
+    assert not service_filter.matches({"name": "CH_Sales", "createdAt": T0 - datetime.timedelta(seconds=1)})
+
+
+# DateTime arguments arrive parsed; aware ones are compared in UTC like strings
+def test_parsed_datetimes_match_strings():
+    from api.schema import parse_datetime
+
+    after = parse_datetime("2024-01-01T14:00:00+02:00")
+    before = parse_datetime("2024-01-01T15:00:00Z")
+    assert after.tzinfo is not None
+    assert sql_ids(IPFilter(created_after=after, created_before=before)) == [3, 4, 5]
+    assert matched_ids(IPFilter(created_after=after, created_before=before)) == [3, 4, 5]
+
+
+# Malformed timestamps are rejected by GraphQL validation, before any resolver runs
+@pytest.mark.parametrize(
+    "query, variables",
+    [
+        ('{ ipAddresses(createdAfter: "yesterday") { id } }', None),
+        ('{ services(createdBefore: "2024-13-01") { id } }', None),
+        ("query Q($t: DateTime) { ipAddresses(updatedBefore: $t) { id } }", {"t": "soon"}),
+        ('{ ipByAddress(address: "185.180.14.1", asOf: "last week") { id } }', None),
+    ],
+)
+def test_invalid_datetime_arguments(query, variables):
+    from ariadne import graphql_sync
+    from api.schema import schema
+
+    _, result = graphql_sync(schema, {"query": query, "variables": variables})
+    assert result.get("data") is None
+    assert "Invalid ISO 8601 timestamp" in result["errors"][0]["message"]
@@ -0,0 +1,69 @@
+# Unit tests for the background health monitor
+# File: /tests/test_health.py
+
+import os
+import pytest
+from api.health import HealthMonitor
+
+
+def up():
+    pass
+
+
+def down():
+    raise RuntimeError("connection refused")
+
+
+# A monitor without its probe thread: the tests run the checks
+@pytest.fixture
+def monitor():
+    probes = {"database": up, "consul": down}
+    monitor = HealthMonitor(probes, required=("database",), interval=60, max_age=10)
+    monitor._pid = os.getpid()
+    return monitor
+
+
+# The first read runs a synchronous check; each result has its status and latency
+def test_results(monitor):
+    results = monitor.results()
+    assert results["database"]["status"] == "up"
+    assert results["consul"] == {
+        "status": "down",
+        "error": "connection refused",
+        "latencyMs": results["consul"]["latencyMs"],
+        "checkedAt": results["consul"]["checkedAt"],
+    }
+    assert monitor.results() is results  # Answered from memory until the next check
+    assert monitor.healthy("database")
+    assert not monitor.healthy("consul")
+
+
+# Only required dependencies decide readiness
+def test_readiness_follows_required_probes(monitor):
+    body, status = monitor.readiness()
+    assert (body["status"], status) == ("ready", 200)
+    monitor.probes["database"] = down
+    monitor.check()
+    body, status = monitor.readiness()
+    assert (body["status"], status) == ("unready", 503)
+    assert body["checks"]["database"]["error"] == "connection refused"
+
+
+# Results older than max_age no longer count, even when they said "up"
+def test_stale_results(monitor):
+    monitor.results()
+    monitor._checked_at -= 11
+    assert monitor.stale()
+    assert not monitor.healthy("database")
+    body, status = monitor.readiness()
+    assert (body["status"], body["error"], status) == ("unready", "health checks are stale", 503)
+    monitor.check()
+    assert monitor.healthy("database")
+    assert monitor.readiness()[1] == 200
+
+
+# Liveness ignores the dependencies
+def test_liveness(monitor):
+    monitor.probes["database"] = down
+    body, status = monitor.liveness()
+    assert (body["status"], body["pid"], status) == ("alive", os.getpid(), 200)
@@ -0,0 +1,79 @@
+# Unit tests for keyset pagination of the web lists
+# File: /tests/test_pagination.py
+
+import datetime
+import pytest
+from sqlalchemy import Column, DateTime, Integer, String, create_engine
+from sqlalchemy.orm import Session, declarative_base
+from web.pagination import keyset_paginate
+
+Base = declarative_base()
+
+
+class Row(Base):
+    __tablename__ = "rows"
+    id = Column(Integer, primary_key=True)
+    status = Column(String)
+    updated_at = Column(DateTime)
+
+
+SORT_COLUMNS = {"id": Row.id, "status": Row.status, "updated_at": Row.updated_at}
+START = datetime.datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        for i in range(1, 24):
+            # Ties on updated_at and status, and some NULLs
+            updated_at = None if i % 7 == 0 else START + datetime.timedelta(hours=i // 3)
+            session.add(Row(id=i, status=("active", "inactive")[i % 2], updated_at=updated_at))
+        session.commit()
+        yield session
+
+
+def walk(session, sort, direction):
+    args = {"sort": sort, "dir": direction, "per_page": "5"}
+    pages = [keyset_paginate(session.query(Row), args, SORT_COLUMNS, Row.id, "updated_at", "desc")]
+    while pages[-1].has_next:
+        args = pages[-1].next_args()
+        pages.append(keyset_paginate(session.query(Row), args, SORT_COLUMNS, Row.id, "updated_at", "desc"))
+    return pages
+
+
+# Following next links visits every row once, in the same order as a full sort
+@pytest.mark.parametrize("sort", ["id", "status", "updated_at"])
+@pytest.mark.parametrize("direction", ["asc", "desc"])
+def test_next_links_cover_all_rows_in_order(session, sort, direction):
+    column = SORT_COLUMNS[sort]
+    ordering = (
+        (column.asc().nullslast(), Row.id.asc())
+        if direction == "asc"
+        else (column.desc().nullslast(), Row.id.desc())
+    )
+    expected = [row.id for row in session.query(Row).order_by(*ordering)]
+    pages = walk(session, sort, direction)
+    assert [row.id for page in pages for row in page.items] == expected
+    assert [page.page for page in pages] == list(range(1, len(pages) + 1))
+    assert not pages[0].has_prev and all(page.has_prev for page in pages[1:])
+
+
+# Previous links return exactly the pages seen on the way forward
+@pytest.mark.parametrize("sort", ["status", "updated_at"])
+def test_previous_links_return_to_earlier_pages(session, sort):
+    pages = walk(session, sort, "desc")
+    page = pages[-1]
+    for expected in reversed(pages[:-1]):
+        page = keyset_paginate(session.query(Row), page.prev_args(), SORT_COLUMNS, Row.id, "updated_at", "desc")
+        assert [row.id for row in page.items] == [row.id for row in expected.items]
+        assert page.page == expected.page and page.has_next
+    assert not page.has_prev
+
+
+# A tampered cursor falls back to the first page
+def test_malformed_cursor_starts_over(session):
+    args = {"after": "not-a-cursor", "page": "4"}
+    page = keyset_paginate(session.query(Row), args, SORT_COLUMNS, Row.id, "updated_at", "desc")
+    assert page.page == 1 and not page.has_prev
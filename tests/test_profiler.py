@@ -0,0 +1,49 @@
+# Unit tests for the per-request SQL profiler
+# File: /tests/test_profiler.py
+
+import pytest
+from sqlalchemy import create_engine, text, bindparam
+from database import profiler
+
+
+# Installs the global Engine hooks for one test, and removes them afterwards
+@pytest.fixture
+def installed_profiler():
+    was_installed = profiler._installed
+    profiler.install()
+    yield profiler
+    if not was_installed:
+        profiler.uninstall()
+
+
+# Expanded IN lists of any length share one shape
+def test_statement_shape_collapses_in_lists():
+    short = profiler.statement_shape("SELECT * FROM t WHERE id IN (%(id_1_1)s, %(id_1_2)s)")
+    long = profiler.statement_shape("SELECT *\n  FROM t WHERE id IN (%(id_1_1)s, %(id_1_2)s, %(id_1_3)s)")
+    assert short == long == "SELECT * FROM t WHERE id IN (...)"
+
+
+# The same statement run once per parent is reported as repeated
+def test_profile_flags_repeated_statements(installed_profiler):
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TABLE t (id INTEGER)"))
+        with profiler.profile("test") as query_profile:
+            conn.execute(text("SELECT count(*) FROM t"))
+            for i in range(profiler.REPEAT_THRESHOLD):
+                conn.execute(text("SELECT * FROM t WHERE id = :id"), {"id": i})
+            conn.execute(
+                text("SELECT * FROM t WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+                {"ids": [1, 2, 3]},
+            )
+        conn.execute(text("SELECT 1"))  # Outside the profile
+
+    summary = query_profile.summary()
+    assert summary["statements"] == profiler.REPEAT_THRESHOLD + 2
+    assert summary["repeated"] == [
+        {
+            "statement": "SELECT * FROM t WHERE id = ?",
+            "count": profiler.REPEAT_THRESHOLD,
+            "totalMs": summary["repeated"][0]["totalMs"],
+        }
+    ]
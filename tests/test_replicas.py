@@ -0,0 +1,82 @@
+# Unit tests for read-replica routing and fallback to the primary
+# File: /tests/test_replicas.py
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import text
+from database import replicas
+from database.replicas import ReplicaRouter
+
+
+def primary_factory(lsn="0/3000060"):
+    engine = create_engine("sqlite://")
+    query = text("SELECT NULL") if lsn is None else text(f"SELECT '{lsn}'")
+    return sessionmaker(bind=engine), query
+
+
+# Replicas backed by SQLite (no PostgreSQL driver here). check(*lags) sets each replica's answer to the lag
+# query: seconds, "unknown" (NULL) or None (unreachable), then runs a check.
+@pytest.fixture
+def router(monkeypatch):
+    factory, lsn_query = primary_factory()
+    monkeypatch.setattr(replicas, "PRIMARY_LSN_QUERY", lsn_query)
+    router = ReplicaRouter(factory, ["sqlite:///replica-a", "sqlite:///replica-b"], max_lag=5)
+    router._pid = replicas.os.getpid()  # No checker thread: the tests run the checks
+
+    def check(*lags):
+        primary_lsn = router.primary_lsn()
+        for replica, lag in zip(router.replicas, lags):
+            url = "sqlite:////nonexistent/replica.db" if lag is None else "sqlite://"
+            replica.engine = create_engine(url)
+            monkeypatch.setattr(replicas, "LAG_QUERY", text("SELECT NULL" if lag == "unknown" else f"SELECT {lag}"))
+            replica.check(router.max_lag, primary_lsn, router.receiver_timeout)
+
+    router.run_check = check
+    return router
+
+
+# Until the first check, every read goes to the primary
+def test_unchecked_replicas_fall_back_to_primary(router):
+    assert router.pick() is router.primary_factory
+
+
+# Healthy replicas are used in turn; lagging, unknown and unreachable ones are skipped
+def test_round_robin_over_healthy_replicas(router):
+    router.run_check(0, 1.5)
+    assert [router.pick() for _ in range(4)] == [router.replicas[0].SessionLocal, router.replicas[1].SessionLocal] * 2
+    router.run_check(30, 1.5)
+    assert [router.pick() for _ in range(3)] == [router.replicas[1].SessionLocal] * 3
+    router.run_check("unknown", None)
+    assert router.pick() is router.primary_factory
+    assert router.status() == [
+        {"replica": "sqlite:///replica-a", "healthy": False, "lag": None},
+        {"replica": "sqlite:///replica-b", "healthy": False, "lag": None},
+    ]
+
+
+# A replica that catches up is used again
+def test_replica_recovers(router):
+    router.run_check(30, 30)
+    assert router.pick() is router.primary_factory
+    router.run_check(30, 0)
+    assert router.pick() is router.replicas[1].SessionLocal
+    assert router.replicas[1].state == "up"
+
+
+# The primary position is read once per check; an unreadable primary gives None
+def test_primary_lsn(monkeypatch):
+    factory, lsn_query = primary_factory("0/16B3748")
+    monkeypatch.setattr(replicas, "PRIMARY_LSN_QUERY", lsn_query)
+    assert ReplicaRouter(factory, []).primary_lsn() == "0/16B3748"
+    monkeypatch.setattr(replicas, "PRIMARY_LSN_QUERY", text("SELECT * FROM missing"))
+    assert ReplicaRouter(factory, []).primary_lsn() is None
+
+
+# A caught-up replica only counts as 0 behind while its WAL receiver streams
+def test_lag_query_checks_wal_receiver():
+    sql = str(replicas.LAG_QUERY.compile(dialect=postgresql.dialect()))
+    assert "pg_stat_wal_receiver WHERE status = 'streaming'" in sql
+    assert "last_msg_receipt_time > now() - make_interval(secs => %(receiver_timeout)s)" in sql
+    assert "pg_wal_lsn_diff(CAST(%(primary_lsn)s AS pg_lsn), pg_last_wal_replay_lsn())" in sql
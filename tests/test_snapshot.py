@@ -0,0 +1,104 @@
+# Unit tests for the binary snapshot format
+# File: /tests/test_snapshot.py
+
+import datetime
+import ipaddress
+import pytest
+from database.snapshot import SnapshotReader, SnapshotStore, write_snapshot
+
+CREATED = datetime.datetime(2024, 1, 1, 9, 0)
+
+SERVICES = [
+    {"id": 1, "name": "ChannelX", "description": "IP addresses for ChannelX services", "created_at": CREATED},
+    {"id": 2, "name": "Sellers", "description": None, "created_at": CREATED},
+]
+
+
+def ip_record(id, service_id, ip_address=None, ip_range=None, range_start=None, range_end=None, status="active"):
+    return {
+        "id": id,
+        "service_id": service_id,
+        "ip_address": ip_address,
+        "ip_range": ip_range,
+        "range_start": range_start,
+        "range_end": range_end,
+        "status": status,
+        "created_at": CREATED,
+        "updated_at": CREATED,
+        "deactivated_at": None,
+    }
+
+
+RECORDS = [
+    ip_record(1, 1, ip_address="185.180.14.1"),
+    ip_record(2, 2, range_start="10.0.0.0", range_end="10.0.255.255"),
+    ip_record(3, 2, ip_range="192.168.1.0/24", status="inactive"),
+    ip_record(4, None, ip_address="2001:db8::1"),
+    ip_record(5, 1, range_start="10.0.5.0", range_end="10.0.5.10"),
+]
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = str(tmp_path / "ipman.snap")
+    write_snapshot(path, SERVICES, RECORDS)
+    return SnapshotReader(path)
+
+
+# Single addresses and start/end ranges are found by ipByAddress
+def test_find_address(snapshot):
+    record = snapshot.record(snapshot.find_address(ipaddress.ip_address("185.180.14.1")))
+    assert record["id"] == 1
+    assert record["service"]["name"] == "ChannelX"
+    assert record["createdAt"] == CREATED
+    assert snapshot.record(snapshot.find_address(ipaddress.ip_address("10.0.200.1")))["id"] == 2
+    assert snapshot.record(snapshot.find_address(ipaddress.ip_address("10.0.5.3")))["id"] in (2, 5)
+    assert snapshot.record(snapshot.find_address(ipaddress.ip_address("2001:db8::1")))["service"] is None
+    assert snapshot.find_address(ipaddress.ip_address("10.1.0.0")) is None
+    # CIDR rows are not matched by address, as in the database query
+    assert snapshot.find_address(ipaddress.ip_address("192.168.1.5")) is None
+
+
+# ipByCIDR returns CIDR records contained in the given network
+def test_find_within(snapshot):
+    assert snapshot.find_within(ipaddress.ip_network("192.168.0.0/16")) != []
+    assert snapshot.find_within(ipaddress.ip_network("192.168.1.128/25")) == []
+
+
+# service(id) returns the service with its IP records
+def test_service_with_ips(snapshot):
+    service = snapshot.service(snapshot.find_service(2), include_ips=True)
+    assert service["name"] == "Sellers"
+    assert service["description"] is None
+    assert sorted(ip["id"] for ip in service["ipAddresses"]) == [2, 3]
+    assert snapshot.find_service(3) is None
+
+
+# The store picks up a replaced snapshot file
+def test_store_reloads_replaced_file(tmp_path):
+    path = str(tmp_path / "ipman.snap")
+    write_snapshot(path, SERVICES, RECORDS, generated_at=1)
+    store = SnapshotStore(path, reload_interval=0)
+    assert store.get().generated_at == 1
+    write_snapshot(path, SERVICES, RECORDS[:1], generated_at=2)
+    assert store.get().generated_at == 2
+    assert store.get().n_records == 1
+
+
+# Misses and hits stay cheap behind wide ranges and many CIDRs
+def test_lookup_reads_are_bounded(tmp_path):
+    records = [ip_record(1, 1, range_start="10.0.0.0", range_end="10.255.255.255")]
+    records += [ip_record(100 + i, 2, ip_address=f"10.0.{i // 250}.{i % 250 + 1}") for i in range(5000)]
+    records += [ip_record(10000 + i, 2, ip_range=f"172.16.{i // 16}.{(i % 16) * 16}/28") for i in range(2000)]
+    path = str(tmp_path / "ipman.snap")
+    write_snapshot(path, SERVICES, records)
+    reader = SnapshotReader(path)
+    reads = []
+    range_entry = reader._range
+    reader._range = lambda *args: reads.append(args) or range_entry(*args)
+
+    assert reader.record(reader.find_address(ipaddress.ip_address("10.0.19.250")))["id"] == 5099
+    assert reader.record(reader.find_address(ipaddress.ip_address("10.0.19.251")))["id"] == 1
+    assert reader.find_address(ipaddress.ip_address("172.16.5.1")) is None
+    assert len(reads) < 10
+    assert len(reader.find_within(ipaddress.ip_network("172.16.0.0/24"))) == 16
@@ -0,0 +1,108 @@
+# Unit tests for subscription matching and change notifications
+# File: /tests/test_subscriptions.py
+
+import json
+import datetime
+import pytest
+from graphql import GraphQLError
+from api.schema import schema
+from api.subscriptions import PreparedSubscription, changes_from_notification, notification_ids
+from comm.server import stream_slots
+
+CHANGED = datetime.datetime(2024, 10, 8, 14, 3, 11)
+
+PAYLOAD = json.dumps(
+    {
+        "changedAt": "2024-10-08T14:03:11.52",
+        "changes": [
+            [1, "active", 2, True, False],  # Deactivated, still on service 2
+            [2, "active", 2, False, True],  # Moved from service 2 to 3
+            [3, None, None, True, True],  # Inserted on service 3
+            [4, "active", 2, True, False],  # Deleted before the listener read it
+        ],
+    }
+)
+
+ROWS = [
+    (1, "185.180.14.1", None, None, None, "inactive", 2, "Sellers", CHANGED, CHANGED, CHANGED),
+    (2, None, "10.0.0.0/24", None, None, "active", 3, "ChannelX", CHANGED, CHANGED, None),
+    (3, None, None, "10.1.0.1", "10.1.0.9", "active", 3, "ChannelX", CHANGED, None, None),
+]
+
+
+@pytest.fixture
+def changes():
+    return changes_from_notification(PAYLOAD, ROWS)
+
+
+# Rows become IPChange values; ids missing from the rows are skipped
+def test_changes_from_notification(changes):
+    assert notification_ids(PAYLOAD) == [1, 2, 3, 4]
+    assert [change["ip"]["id"] for change in changes] == [1, 2, 3]
+    first = changes[0]
+    assert first["ip"]["status"] == "inactive"
+    assert first["ip"]["service"]["name"] == "Sellers"
+    assert first["ip"]["deactivatedAt"] == "2024-10-08T14:03:11"
+    assert first["previousStatus"] == "active"
+    assert first["changedAt"] == "2024-10-08T14:03:11.52"
+    assert (first["statusChanged"], first["serviceChanged"]) == (True, False)
+    assert changes[2]["ip"]["updatedAt"] is None
+    assert changes[2]["previousServiceId"] is None
+
+
+def matching_ids(query, changes, variables=None):
+    prepared = PreparedSubscription(schema, query, variables)
+    return [change["ip"]["id"] for change in changes if prepared.matches(change)]
+
+
+# Each field receives its kind of change, filtered by the service argument
+@pytest.mark.parametrize(
+    "query, variables, expected",
+    [
+        ("subscription { ipStatusChanged { changedAt } }", None, [1, 3]),
+        ("subscription { ipStatusChanged(serviceId: 2) { changedAt } }", None, [1]),
+        ("subscription { ipAssignmentChanged { changedAt } }", None, [2, 3]),
+        # The previous and the new service both see a move
+        ("subscription { ipAssignmentChanged(serviceId: 2) { changedAt } }", None, [2]),
+        ("subscription S($id: ID) { ipAssignmentChanged(serviceId: $id) { changedAt } }", {"id": "3"}, [2, 3]),
+    ],
+)
+def test_prepared_subscription_matching(changes, query, variables, expected):
+    assert matching_ids(query, changes, variables) == expected
+
+
+# A matching change is rendered with the subscriber's selection
+def test_prepared_subscription_execute(changes):
+    prepared = PreparedSubscription(
+        schema, "subscription { ipStatusChanged { ip { ipAddress status service { name } } previousStatus } }"
+    )
+    assert prepared.execute(changes[0]) == {
+        "data": {
+            "ipStatusChanged": {
+                "ip": {"ipAddress": "185.180.14.1", "status": "inactive", "service": {"name": "Sellers"}},
+                "previousStatus": "active",
+            }
+        }
+    }
+
+
+# Only one plain subscription operation can be streamed
+@pytest.mark.parametrize(
+    "query",
+    [
+        "{ services { id } }",
+        "subscription { ipStatusChanged { nope } }",
+        "subscription { ... on Subscription { ipStatusChanged { changedAt } } }",
+        "subscription {",
+    ],
+)
+def test_prepared_subscription_rejects(query):
+    with pytest.raises(GraphQLError):
+        PreparedSubscription(schema, query)
+
+
+# Streams never get more than half of a worker's slots
+def test_stream_slots():
+    assert stream_slots(None) is None
+    assert stream_slots(1) == 0
+    assert stream_slots(8) == 4
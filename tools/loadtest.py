@@ -0,0 +1,198 @@
+# Load test comparing Gunicorn worker profiles (see comm/server.py)
+# File: /tools/loadtest.py
+#
+# Starts the API once per profile on a local port, drives it with a fixed
+# number of concurrent keep-alive clients for a fixed duration, stops it,
+# and prints throughput and latency percentiles side by side. The clients use
+# the same Consul/database settings as the server, so run it on a node that
+# matches production.
+#
+#   python tools/loadtest.py --profiles sync gthread:threads=8 gevent \
+#       --concurrency 32 --duration 30 --json results.json
+#
+# A profile is "<worker class>[:workers=N][:threads=N]". Rate limiting is
+# turned off for the servers under test; load shedding (503) stays on and is
+# reported. The load generator is a Python process too: for high request
+# rates, check that it is not the bottleneck (CPU usage of this process), or
+# give the server its own machine and use --url.
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlsplit
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_QUERY = '{ ipByAddress(address: "185.180.14.1") { id status service { name } } }'
+
+
+def parse_profile(spec):
+    worker_class, *options = spec.split(":")
+    profile = {"name": spec, "worker_class": worker_class}
+    for option in options:
+        key, _, value = option.partition("=")
+        if key not in ("workers", "threads"):
+            raise ValueError(f"Unknown profile option '{key}' in '{spec}'.")
+        profile[key] = int(value)
+    return profile
+
+
+def start_server(profile, port):
+    command = [sys.executable, "-m", "comm.server", "api", "--bind", f"127.0.0.1:{port}"]
+    command += ["--worker-class", profile["worker_class"]]
+    for key in ("workers", "threads"):
+        if key in profile:
+            command += [f"--{key}", str(profile[key])]
+    env = dict(os.environ, IPMAN_RATE_LIMIT="0", PYTHONPATH=ROOT)
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_ready(host, port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request("GET", "/health/live")
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+# One keep-alive client sending requests back to back until the deadline
+def client(host, port, path, body, deadline, latencies, statuses, lock):
+    headers = {"Content-Type": "application/json"}
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    local_latencies, local_statuses = [], Counter()
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            if body is None:
+                conn.request("GET", path)
+            else:
+                conn.request("POST", path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            local_statuses[response.status] += 1
+            if response.status == 200:
+                local_latencies.append(time.perf_counter() - started)
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # Keep-alive connection closed by the server (e.g. worker recycled by max_requests)
+            local_statuses["reconnect"] += 1
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+        except (OSError, http.client.HTTPException):
+            local_statuses["error"] += 1
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+    conn.close()
+    with lock:
+        latencies.extend(local_latencies)
+        statuses.update(local_statuses)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_load(host, port, path, body, concurrency, duration, warmup):
+    if warmup:
+        run_load(host, port, path, body, concurrency, warmup, 0)
+    latencies, statuses, lock = [], Counter(), threading.Lock()
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=client, args=(host, port, path, body, deadline, latencies, statuses, lock))
+        for _ in range(concurrency)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    ms = lambda value: round(value * 1000, 2) if value is not None else None  # noqa: E731
+    reconnects = statuses.pop("reconnect", 0)
+    return {
+        "requests": sum(statuses.values()),
+        "rps": round(statuses[200] / elapsed, 1),
+        "p50Ms": ms(percentile(latencies, 0.50)),
+        "p95Ms": ms(percentile(latencies, 0.95)),
+        "p99Ms": ms(percentile(latencies, 0.99)),
+        "shed": statuses[503] + statuses[429],
+        "errors": sum(count for status, count in statuses.items() if status not in (200, 429, 503)),
+        "reconnects": reconnects,
+    }
+
+
+def print_table(results):
+    columns = ("profile", "rps", "p50Ms", "p95Ms", "p99Ms", "shed", "errors", "reconnects")
+    rows = [[str(result.get(column)) for column in columns] for result in results]
+    widths = [max(len(column), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare Gunicorn worker profiles under load.")
+    parser.add_argument("--profiles", nargs="+", default=["sync", "gthread", "gevent"])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of measured load per profile.")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds of unmeasured load first.")
+    parser.add_argument("--port", type=int, default=5050)
+    parser.add_argument("--query", default=DEFAULT_QUERY, help="GraphQL query to send.")
+    parser.add_argument("--path", default="/graphql", help="GET this path instead of posting the query.")
+    parser.add_argument("--url", help="Measure an already running server instead of starting profiles.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args(argv)
+
+    body = json.dumps({"query": args.query}) if args.path == "/graphql" else None
+    results = []
+    if args.url:
+        url = urlsplit(args.url)
+        result = run_load(url.hostname, url.port or 80, args.path, body, args.concurrency, args.duration, args.warmup)
+        results.append(dict(result, profile=args.url))
+    else:
+        for spec in args.profiles:
+            profile = parse_profile(spec)
+            process = start_server(profile, args.port)
+            try:
+                if not wait_ready("127.0.0.1", args.port):
+                    print(f"Profile {spec}: server did not become live, skipped.", file=sys.stderr)
+                    continue
+                result = run_load("127.0.0.1", args.port, args.path, body, args.concurrency, args.duration, args.warmup)
+                results.append(dict(result, profile=spec))
+            finally:
+                stop_server(process)
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(
+                {"concurrency": args.concurrency, "duration": args.duration, "path": args.path, "results": results},
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -10,11 +10,17 @@ from sqlalchemy.sql import text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import joinedload
 from sqlalchemy.dialects.postgresql import CIDR
-from database.db import get_db_session
+from database.db import get_db_session, get_read_session
 from database.models import (
     IPAddress,
     Service,
+    ServiceSummary,
 )  # Import the IPAddress model and  the Service model here
+from database.summary import refresh_service_summary
+from database.filters import IPFilter, ServiceFilter, FilterError
+from database.validation import range_error
+from web.pagination import paginate, keyset_paginate
+from comm.config import env_setting
 from ipaddress import ip_network
 
 
@@ -22,7 +28,8 @@ from ipaddress import ip_network
 web_app = Flask(__name__)
 
 # Set the secret key to some random bytes. Keep this secret and unique in a real application.
-web_app.secret_key = os.urandom(24)
+# Workers must share the key (flash messages): set IPMAN_WEB_SECRET_KEY, or preload the app
+web_app.secret_key = env_setting("IPMAN_WEB_SECRET_KEY") or os.urandom(24)
 
 
 # Route to show service creation form (or edit if id is provided)
@@ -42,12 +49,39 @@ def add_service_form():
     return render_template("service_form.html", service=None)
 
 
-# Route to list all services
+# Sortable columns for the service list (served from the precomputed summary)
+SERVICE_SORT_COLUMNS = {
+    "id": Service.id,
+    "name": Service.name,
+    "ip_count": ServiceSummary.ip_count,
+    "active_count": ServiceSummary.active_count,
+    "last_changed_at": ServiceSummary.last_changed_at,
+}
+
+
+# Services joined with their summary counters
+def service_summary_query(session):
+    return session.query(Service, ServiceSummary).outerjoin(
+        ServiceSummary, ServiceSummary.service_id == Service.id
+    )
+
+
+# Services with their counters, narrowed by the filters in the query string
+def filtered_service_query(session):
+    try:
+        return ServiceFilter.from_args(request.args).apply(service_summary_query(session))
+    except FilterError as e:
+        flash(str(e))
+        return service_summary_query(session)
+
+
+# Route to list services (paginated, sortable and filterable by name)
 @web_app.route("/services", methods=["GET"])
 def service_list():
-    with next(get_db_session()) as session:
-        services = session.query(Service).all()
-        return render_template("service_list.html", services=services)
+    with next(get_read_session()) as session:
+        query = filtered_service_query(session)
+        page = paginate(query, request.args, SERVICE_SORT_COLUMNS, Service.id, "name")
+        return render_template("service_list.html", page=page)
 
 
 # Route to handle form submission for adding/updating a service
@@ -77,13 +111,15 @@ def save_service():
             service.name = service_name
             service.description = service_description  # Update description if provided
         else:  # No 'id' means this is a new record
-            new_service = Service(
+            service = Service(
                 name=service_name,
                 description=service_description,  # Set description
                 created_at=func.now(),
             )
-            session.add(new_service)
+            session.add(service)
 
+        session.flush()  # Assigns the id of a new service
+        refresh_service_summary(session, [service.id])
         session.commit()
 
     return redirect(url_for("service_list"))
@@ -181,12 +217,18 @@ def save_ip():
             flash("Invalid CIDR range. Please provide a valid network address.")
             return redirect(request.referrer)
 
+    error = range_error(range_start, range_end)
+    if error:
+        flash(error)
+        return redirect(request.referrer)
+
     with next(get_db_session()) as session:
         if "id" in request.args:  # If updating an existing IP
             ip = session.query(IPAddress).get(request.args["id"])
             if not ip:
                 flash("IP not found.")
                 return redirect(request.referrer)
+            affected_services = [ip.service_id, service_id]
 
             # Update existing record
             ip.ip_address = ip_address
@@ -209,19 +251,35 @@ def save_ip():
                 updated_at=func.now(),
             )
             session.add(new_ip)
+            affected_services = [service_id]
+        session.flush()
+        refresh_service_summary(session, affected_services)
         session.commit()
 
     return redirect(url_for("ip_list"))
 
 
-# Route to list all IPs (for viewing in a list)
+# Sortable columns for the IP list
+IP_SORT_COLUMNS = {
+    "id": IPAddress.id,
+    "status": IPAddress.status,
+    "created_at": IPAddress.created_at,
+    "updated_at": IPAddress.updated_at,
+}
+
+
+# Route to list IPs (keyset paginated, sortable and filterable)
 @web_app.route("/ips", methods=["GET"])
 def ip_list():
-    with next(get_db_session()) as session:
-        ips = (
-            session.query(IPAddress).options(joinedload(IPAddress.service)).all()
-        )  # Ensure service is fetched
-        return render_template("ip_list.html", ips=ips)
+    with next(get_read_session()) as session:
+        query = session.query(IPAddress).options(joinedload(IPAddress.service))
+        try:
+            query = IPFilter.from_args(request.args).apply(query)
+        except FilterError as e:
+            flash(str(e))
+        page = keyset_paginate(query, request.args, IP_SORT_COLUMNS, IPAddress.id, "updated_at", "desc")
+        services = session.query(Service.id, Service.name).order_by(Service.name).all()
+        return render_template("ip_list.html", page=page, services=services)
 
 
 # Route to show IP creation/update form
@@ -269,6 +327,11 @@ def add_ip():
             flash("Invalid CIDR range. Please provide a valid network address.")
             return redirect(url_for("add_ip_form"))
 
+    error = range_error(range_start, range_end)
+    if error:
+        flash(error)
+        return redirect(url_for("add_ip_form"))
+
     with next(get_db_session()) as session:
         # Create a new IP or range
         ip = IPAddress(
@@ -282,6 +345,8 @@ def add_ip():
             updated_at=func.now(),  # Set updated_at timestamp
         )
         session.add(ip)
+        session.flush()
+        refresh_service_summary(session, [service_id])
         session.commit()
 
     return redirect(url_for("index"))
@@ -296,25 +361,42 @@ def toggle_ip_status(ip_id):
             ip.deactivate()
         else:
             ip.activate()
+        session.flush()
+        refresh_service_summary(session, [ip.service_id])
         session.commit()
     return redirect(url_for("ip_list"))
 
 
-# Route to fetch and display services and IPs for the API
+# Route to show the dashboard: services from the summary and the most recent IP changes
 @web_app.route("/", methods=["GET"])
 def index():
-    with next(get_db_session()) as session:
-        # Query all services and IPs
-        services = session.query(Service).all()
-        ips = session.query(IPAddress).options(joinedload(IPAddress.service)).all()
+    with next(get_read_session()) as session:
+        page = paginate(
+            filtered_service_query(session),
+            request.args,
+            SERVICE_SORT_COLUMNS,
+            Service.id,
+            "last_changed_at",
+            "desc",
+        )
+        recent_ips = (
+            session.query(IPAddress)
+            .options(joinedload(IPAddress.service))
+            .order_by(IPAddress.updated_at.desc(), IPAddress.id.desc())
+            .limit(page.per_page)
+            .all()
+        )
+        services = session.query(Service.id, Service.name).order_by(Service.name).all()
 
-        # Pass both services and IPs to the template (if needed)
-        return render_template("index.html", services=services, ips=ips)
+        return render_template(
+            "index.html", page=page, ips=recent_ips, services=services
+        )
 
 
 # Function to run API (on all IPs)
+# Development server only; production runs under Gunicorn (python -m comm.server web)
 def run_web():
-    web_app.run(debug=True, host="0.0.0.0", port=5001)
+    web_app.run(debug=env_setting("IPMAN_DEBUG", False, bool), host="0.0.0.0", port=5001)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,170 @@
+# Server-side pagination and sorting for the web list pages
+# File: /web/pagination.py
+
+import json
+import base64
+import datetime
+from collections import namedtuple
+from sqlalchemy import and_, or_
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+ListArgs = namedtuple("ListArgs", ["page", "per_page", "sort", "direction"])
+
+
+class Page:
+    def __init__(self, items, list_args, has_next, args):
+        self.items = items
+        self.page = list_args.page
+        self.per_page = list_args.per_page
+        self.sort = list_args.sort
+        self.direction = list_args.direction
+        self.has_next = has_next
+        self.has_prev = list_args.page > 1
+        self.args = args  # Current query string (filters), kept across page links
+        self.next_cursor = None
+        self.prev_cursor = None
+
+    # Query string arguments for a link to another page or sort order
+    def url_args(self, **overrides):
+        args = dict(self.args)
+        args.update(overrides)
+        return {key: value for key, value in args.items() if value not in (None, "")}
+
+    # Arguments for the next / previous page links (keyset cursors when the page has them)
+    def next_args(self):
+        if self.next_cursor:
+            return self.url_args(page=self.page + 1, after=self.next_cursor)
+        return self.url_args(page=self.page + 1)
+
+    def prev_args(self):
+        if self.prev_cursor:
+            return self.url_args(page=self.page - 1, before=self.prev_cursor)
+        return self.url_args(page=self.page - 1)
+
+    # Arguments for a column header link: toggles direction on the current sort column
+    def sort_args(self, column):
+        direction = "desc" if self.sort == column and self.direction == "asc" else "asc"
+        return self.url_args(sort=column, dir=direction, page=1)
+
+
+def _positive_int(value, default):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+# Parse page/per_page/sort/dir from the query string, falling back to safe defaults
+def list_args(args, sort_columns, default_sort, default_direction="asc"):
+    sort = args.get("sort") if args.get("sort") in sort_columns else default_sort
+    direction = args.get("dir") if args.get("dir") in ("asc", "desc") else default_direction
+    return ListArgs(
+        page=_positive_int(args.get("page"), 1),
+        per_page=min(_positive_int(args.get("per_page"), DEFAULT_PER_PAGE), MAX_PER_PAGE),
+        sort=sort,
+        direction=direction,
+    )
+
+
+def paginate(query, args, sort_columns, tiebreaker, default_sort, default_direction="asc"):
+    """Fetch one page of query, ordered by a whitelisted column.
+
+    One extra row is fetched to know whether there is a next page, so no
+    COUNT(*) over the whole (filtered) table is needed.
+    """
+    parsed = list_args(args, sort_columns, default_sort, default_direction)
+    column = sort_columns[parsed.sort]
+    if parsed.direction == "desc":
+        ordering = (column.desc().nullslast(), tiebreaker.desc())
+    else:
+        ordering = (column.asc().nullslast(), tiebreaker.asc())
+    rows = (
+        query.order_by(*ordering)
+        .offset((parsed.page - 1) * parsed.per_page)
+        .limit(parsed.per_page + 1)
+        .all()
+    )
+    current = {key: value for key, value in args.items() if key != "page"}
+    return Page(rows[: parsed.per_page], parsed, len(rows) > parsed.per_page, current)
+
+
+def _cursor(row, column, tiebreaker):
+    value, key = getattr(row, column.key), getattr(row, tiebreaker.key)
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, key]).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+# (value, key) from a cursor, or None when it is malformed
+def _decode_cursor(cursor, column):
+    try:
+        value, key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if value is not None and column.type.python_type is datetime.datetime:
+            value = datetime.datetime.fromisoformat(value)
+        return value, int(key)
+    except (ValueError, TypeError, NotImplementedError):
+        return None
+
+
+# Rows strictly after (value, key) when ordered by column then tiebreaker, both
+# ascending or both descending, with NULL column values last or first
+def _after(column, tiebreaker, value, key, ascending, nulls_last):
+    beyond = (lambda a, b: a > b) if ascending else (lambda a, b: a < b)
+    if value is None:
+        null_rows = and_(column.is_(None), beyond(tiebreaker, key))
+        return null_rows if nulls_last else or_(column.isnot(None), null_rows)
+    rows = or_(beyond(column, value), and_(column == value, beyond(tiebreaker, key)))
+    return or_(rows, column.is_(None)) if nulls_last else rows
+
+
+def keyset_paginate(query, args, sort_columns, tiebreaker, default_sort, default_direction="asc"):
+    """Fetch one page of query, seeking from the (sort column, tiebreaker) cursor.
+
+    Unlike paginate(), deep pages cost the same as the first one: the query
+    starts right after the last row of the previous page (after=) or right
+    before the first row of the next one (before=) instead of skipping rows
+    with OFFSET. Rows must expose the sort columns and the tiebreaker as
+    attributes of the same name; the tiebreaker must be a unique integer
+    (the primary key). The page number is only carried along for display.
+    """
+    parsed = list_args(args, sort_columns, default_sort, default_direction)
+    column = sort_columns[parsed.sort]
+    ascending = parsed.direction == "asc"
+    after = _decode_cursor(args.get("after"), column) if args.get("after") else None
+    before = _decode_cursor(args.get("before"), column) if args.get("before") and not after else None
+    if not after and not before:
+        parsed = parsed._replace(page=1)
+
+    if before:
+        # Walk backwards from the cursor, then restore the display order
+        ordering = (
+            (column.desc().nullsfirst(), tiebreaker.desc())
+            if ascending
+            else (column.asc().nullsfirst(), tiebreaker.asc())
+        )
+        query = query.filter(_after(column, tiebreaker, *before, not ascending, nulls_last=False))
+    else:
+        ordering = (
+            (column.asc().nullslast(), tiebreaker.asc())
+            if ascending
+            else (column.desc().nullslast(), tiebreaker.desc())
+        )
+        if after:
+            query = query.filter(_after(column, tiebreaker, *after, ascending, nulls_last=True))
+    rows = query.order_by(*ordering).limit(parsed.per_page + 1).all()
+    more = len(rows) > parsed.per_page
+    rows = rows[: parsed.per_page]
+    if before:
+        rows.reverse()
+
+    current = {key: value for key, value in args.items() if key not in ("page", "after", "before")}
+    page = Page(rows, parsed, more if not before else True, current)
+    page.has_prev = more if before else bool(after)
+    if rows and page.has_next:
+        page.next_cursor = _cursor(rows[-1], column, tiebreaker)
+    if rows and page.has_prev:
+        page.prev_cursor = _cursor(rows[0], column, tiebreaker)
+    return page